@@ -1,7 +1,6 @@
-import sys, os, datetime, random, base64, time
+import sys, os, base64, time, queue, re, hmac
 import streamlit as st
 import streamlit.components.v1 as components
-from tempfile import mkdtemp
 from pathlib import Path
 import pandas as pd
 
@@ -11,49 +10,106 @@ import pandas as pd
 DEBUG=False
 # Embedding model. Options are: 'bert-base-portuguese-cased' or 'bert-base-multilingual-uncased'
 MODEL='bert-base-portuguese-cased'
+# Number of parsed sentences kept in memory to answer repeated sentences (0 disables the cache)
+CACHE_SIZE=4096
+# Directory keeping the parsed sentences across server restarts, or None to keep them only in memory
+CACHE_DIR=None
+# Seconds of requests summarized by the latency page
+STATS_WINDOW=600
+# Secret that opens the latency page (open the app with ?admin=<secret> to see it), taken from the
+# PORTPARSER_ADMIN_TOKEN environment variable; the page is disabled when it is not set
+ADMIN_TOKEN=os.environ.get('PORTPARSER_ADMIN_TOKEN') or None
+# Remote backends shared by several front ends, or None to load the models in this process.
+# UDPIPE2_SERVER is the URL of a udpipe2_server.py (e.g. 'http://localhost:8001') serving UDPIPE2_MODEL (None for its default model);
+# WEMBEDDING_SERVER is the address of a WEmbeddings server (e.g. 'localhost:8000'), used only when parsing locally
+UDPIPE2_SERVER=None
+UDPIPE2_MODEL=None
+WEMBEDDING_SERVER=None
 
 
 #-----Fuctions-----
 
-# Format external files for interface compatibility
+# Format external files for interface compatibility (read and encoded once per server process)
+@st.cache_resource(show_spinner=False)
+def read_text(path):
+    return Path(path).read_bytes().decode()
+
+@st.cache_resource(show_spinner=False)
 def img_to_bytes(img_path):
     img_bytes = Path(img_path).read_bytes()
     encoded = base64.b64encode(img_bytes).decode()
     return encoded
 
+@st.cache_resource(show_spinner=False)
 def img_to_html(img_path, img_style='max-width: 100%;'):
     img_html = f"<img src='data:image/png;base64,{img_to_bytes(img_path)}' style='{img_style}'>"
     return img_html
 
-# Call parser steps
-def make_conllu(path_text, path_input):
-    try:
-        os.system(f'python portTokenizer/portTok.py -o {path_input} -m -s S0000 {path_text}')
-        return 'Converti o texto para conllu.'       
-    except Exception as e:
-        return str(e)
-        
-def make_embedding(path_input, path_embedding, model_selected):
-    try:
-        os.system(f'python ./wembedding_service/compute_wembeddings.py {path_input} {path_embedding} --model {model_selected}')
-        return 'Fiz as embeddings.'
-    except Exception as e:
-        return str(e)
+# Styles and scripts of the UD tree, compacted (no comments, blank lines or indentation) to shrink the iframe
+@st.cache_resource(show_spinner=False)
+def load_tree_assets():
+    css = re.sub(r'\s+', ' ', re.sub(r'/\*.*?\*/', '', read_text('arborator-draft/arborator-draft.css'), flags=re.S))
+    js = '\n'.join(line.strip() for line in read_text('arborator-draft/arborator-draft.js').split('\n')
+                   if line.strip() and not line.strip().startswith('//'))
+    return '<style>'+css+'</style>'+ \
+        '<script language="JavaScript" type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/d3/4.10.0/d3.js"></script>'+ \
+        '<script src="https://code.jquery.com/jquery-3.2.1.min.js" integrity="sha256-hwg4gsxgFZhOsEEamdOYGBf13FyQuiTwlAQgxVSNgt4=" crossorigin="anonymous"></script>'+ \
+        '<script>'+js+'</script>'
+
+# Load the parser steps once per server process
+@st.cache_resource
+def load_pipeline(model_selected):
+    from pipeline import PortparserPipeline
+    return PortparserPipeline('Portparser_model', model_selected, cache_size=CACHE_SIZE, cache_dir=CACHE_DIR,
+                              stats_window=STATS_WINDOW, udpipe2_server=UDPIPE2_SERVER, udpipe2_model=UDPIPE2_MODEL,
+                              wembedding_server=WEMBEDDING_SERVER)
+
+# Queue of uploaded files parsed in background, shared by all sessions
+@st.cache_resource
+def load_jobs(model_selected):
+    from jobs import JobQueue
+    return JobQueue(load_pipeline(model_selected), workers=1, max_queued=8)
 
-
-def make_predictions(path_input, path_prediction):
-    try:
-        os.system(f'python ./udpipe2/udpipe2.py Portparser_model --predict --predict_input {path_input} --predict_output {path_prediction}')
-        return f'Fiz a predição.'
-    except Exception as e:
-        return str(e)
-
-def make_sentences(path_raw_text, path_text):
-    try:
-        os.system(f'python portSentencer/portSent.py -o {path_text} -r -l 2048 {path_raw_text}')
-        return f'Sentenciei.'
-    except Exception as e:
-        return str(e)
+# Call parser steps
+def make_conllu(pipeline, text, timings=None):
+    return pipeline.tokenize(text, timings=timings)
+
+
+# Embed and parse the sentences, repeated sentences are taken from the cache
+def make_predictions(pipeline, sentences, timings=None):
+    return pipeline.parse_sentences(sentences, timings)
+
+def make_sentences(raw_text):
+    from pipeline import segment
+    return segment(raw_text, limit=2048, replace=True)
+
+
+# Append the batches parsed by a background job as they arrive, then offer the download
+def stream_job(job, progress, download, result):
+    shown = 0
+    while True:
+        # Check the status before taking the chunks, so the last ones are not missed
+        pending = job.pending()
+        chunks = job.chunks[shown:]
+        for chunk in chunks:
+            result.text(chunk)
+        shown += len(chunks)
+        if not pending:
+            break
+        eta = job.eta()
+        status = f'Parsed {job.done} of {job.total} sentences' if job.total else 'Waiting for the parser...'
+        if eta is not None: status += f', about {int(eta)+1}s left'
+        progress.progress(job.done/job.total if job.total else 0., text=status)
+        time.sleep(0.5)
+    if job.status == job.FAILED:
+        progress.text('Não deu certo a predição.'+job.error)
+    else:
+        progress.empty()
+        download.download_button( 
+            label="Download predictions",
+            data=job.result(),
+            file_name='predictions.conllu'
+            )
 
 
 def get_predictions(path_prediction):
@@ -64,49 +120,41 @@ def get_predictions(path_prediction):
         st.text('Resposta: '+e)
 
 
-def run_pipeline(code,tmp_dir,path_text):
-    
-    input_conllu = 'input.conllu' 
-    embedding_conllu = 'input.conllu.npz' 
-    prediction_conllu = 'input_prediction.conllu'
-    model = 'Portparser_model' 
+# Run all the steps in memory, returning the predicted CoNLL-U
+def run_pipeline(text):
+    from latency import Timings
+    timings = Timings()
 
-    path_input = os.path.join(tmp_dir,f'{code}_{input_conllu}')
-    path_prediction = os.path.join(tmp_dir,f'{code}_{prediction_conllu}')
-    path_embedding = os.path.join(tmp_dir,f'{code}_{embedding_conllu}')
+    with st.spinner('Loading the parser...'):
+        pipeline = load_pipeline(model_selected)
 
     with st.spinner('Transforming text into .conllu...'): 
-        time.sleep(1)
-        try:
-            make_conllu(path_text, path_input)
-        except Exception as e:
-            print(e)
-    with st.spinner('Processing embeddings...'): 
-        time.sleep(1)
-        try:
-            make_embedding(path_input, path_embedding, model_selected)
-        except Exception as e:
-            print(e)
-    with st.spinner('Making predictions...'): 
-        time.sleep(1)
-        try:
-            make_predictions(path_input, path_prediction)
-        except Exception as e:
-            print(e)
-    return path_prediction
+        sentences = make_conllu(pipeline, text, timings)
+    with st.spinner('Processing embeddings and making predictions...'): 
+        predictions = make_predictions(pipeline, sentences, timings)
+    pipeline.record(timings, sentences)
+    return predictions
+
+
+# Latency percentiles per stage and throughput of the last requests of this server process
+def show_latency(pipeline):
+    summary = pipeline.stats.summary()
+    st.header('Portparser latency')
+    st.caption(f"Last {summary['requests']} requests in the last {summary['window']}s")
+    metrics = st.columns(4)
+    metrics[0].metric('Sentences', summary['sentences'])
+    metrics[1].metric('Tokens', summary['tokens'])
+    metrics[2].metric('Sentences/s', f"{summary['sentences_per_second']:.2f}")
+    metrics[3].metric('Tokens/s', f"{summary['tokens_per_second']:.2f}")
+    if summary['stages']:
+        st.table(pd.DataFrame.from_dict(summary['stages'], orient='index').rename(
+            columns={'p50':'p50 (ms)','p95':'p95 (ms)','p99':'p99 (ms)'}).style.format(precision=2))
+    if pipeline.cache is not None:
+        st.text(f'Cache: {len(pipeline.cache)} sentences, {pipeline.cache.hits} hits, {pipeline.cache.misses} misses')
 
 #-----Debug mode-----
 
-if DEBUG:
-    tmp_dir = 'temp'
-    code='0'
-    input_text = 'text_input.txt'
-else:
-    tmp_dir = mkdtemp()
-    code = f'{datetime.datetime.now().strftime("%d%m%Y_%H%M%S%f")+str(random.randint(0, 9))}'
-    input_text = 'text_input.txt'
-
-path_text = os.path.join(tmp_dir,f'{code}_{input_text}')
+# Prediction shown before the first parse, and as the result of every parse in debug mode
 path_prediction = os.path.join('temp','0_input_prediction.conllu') # adicionei
 area=0
 with open(path_prediction, 'r', encoding='utf-8') as f:content = f.read().split('\n')
@@ -114,12 +162,19 @@ with open(path_prediction, 'r', encoding='utf-8') as f:content = f.read().split(
 
 #-----Interface-----
 
-with open('arborator-draft/arborator-draft.css','rb') as f: arborator_css = f.read().decode()
-with open('style.css') as f: css = f.read()
+css = read_text('style.css')
 
 st.set_page_config(page_title='Portparser', layout="wide")
 st.markdown(f'<style>{css}</style>', unsafe_allow_html=True)
 
+# Admin page with the latency of the parser steps, only for who knows the admin secret
+if ADMIN_TOKEN is not None and hmac.compare_digest(st.query_params.get('admin', '').encode(), ADMIN_TOKEN.encode()):
+    if DEBUG:
+        st.text('The parser is not loaded in debug mode.')
+    else:
+        show_latency(load_pipeline(MODEL+'-last4'))
+    st.stop()
+
 
 # Grid
 rowall = st.columns([2,26,2])
@@ -172,23 +227,17 @@ with rowall[1]:
                 if not text.strip(): st.text("Can not parse empty text. Write a text above to parse.")                
                 else:
                     try:
-                        with open(path_text,'w',encoding='utf-8') as f: f.write(text)
-                        if not DEBUG: path_prediction = run_pipeline(code,tmp_dir,path_text)
+                        if not DEBUG: content = run_pipeline(text)
+                        else:
+                            with open(path_prediction, 'r', encoding='utf-8') as f: content = f.read()
                         area=650
-                        #else: path_prediction = os.path.join('temp','0_input_prediction.conllu')
-
-                        with open(path_prediction, 'r', encoding='utf-8') as f:
-                            content = f.read()
 
-                            tab1.text(content)
+                        tab1.text(content)
 
-                            input_conllu = 'input.conllu'
-                            path_input = os.path.join(tmp_dir,f'{code}_{input_conllu}')
-                            
-                            content = content.split('\n')
-                            table = pd.DataFrame([line.split('\t') for line in content[4:]])
-                            table.columns = ['ID','FORM','LEMMA','UPOS','XPOS','FEATS','HEAD','DEPREL','DEPS','MISC']
-                            tab2.dataframe(table[:-2], use_container_width=True,hide_index=True)
+                        content = content.split('\n')
+                        table = pd.DataFrame([line.split('\t') for line in content[4:]])
+                        table.columns = ['ID','FORM','LEMMA','UPOS','XPOS','FEATS','HEAD','DEPREL','DEPS','MISC']
+                        tab2.dataframe(table[:-2], use_container_width=True,hide_index=True)
 
                     except Exception as e:
                             st.text('Não deu certo a predição.'+str(e)+repr(e))
@@ -198,13 +247,7 @@ with rowall[1]:
                 # Prepare UD tree
                 content_str = '\n'.join(content)
                 components.html(
-                '<style>'+open('arborator-draft/arborator-draft.css','rb').read().decode()+'</style>'+
-                #'<style>{arborator_css}</style>'+
-                """
-                <script language="JavaScript" type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/d3/4.10.0/d3.js"></script>
-                <script src="https://code.jquery.com/jquery-3.2.1.min.js" integrity="sha256-hwg4gsxgFZhOsEEamdOYGBf13FyQuiTwlAQgxVSNgt4=" crossorigin="anonymous"></script>
-                """+
-                '<script>'+open('arborator-draft/arborator-draft.js','rb').read().decode()+'</script>'+
+                load_tree_assets()+
                 f'<conll>{content_str}</conll>'+
                 '<script>new ArboratorDraft();</script>',height=area)
                
@@ -226,30 +269,46 @@ with rowall[1]:
            
             if submit:
                 if uploaded_file is not None:
-                    # Segment text first 
-                    if split_option==option2:
-                        path_raw_text = path_text[:-3]+'_raw.txt'
-                        with open(path_raw_text, 'w') as f: f.write(uploaded_file.read().decode('utf-8'))
-                        make_sentences(path_raw_text, path_text)
+                    # Segment text first (done by the background job)
+                    segment_upload = split_option==option2
+                    if segment_upload:
+                        text_upload = uploaded_file.read().decode('utf-8')
                     # Do not segment text first    
                     else:
-                        with open(path_text,'w', encoding="utf-8") as f:f.write(uploaded_file.read().decode('utf-8')+' ')
-                    if not DEBUG: path_prediction = run_pipeline(code,tmp_dir,path_text)
-                    st.download_button( 
-                        label="Download predictions",
-                        data=open(path_prediction, 'r', encoding='utf-8').read(),
-                        file_name='predictions.conllu'
-                        )
-                    predictions = True
+                        text_upload = uploaded_file.read().decode('utf-8')+' '
+                    if not DEBUG:
+                        try:
+                            st.session_state['job_id'] = load_jobs(model_selected).submit(text_upload, segment=segment_upload)
+                        except queue.Full:
+                            st.text('The parser is busy with other files. Please try again in a few minutes.')
+                    else:
+                        if segment_upload: text_upload = make_sentences(text_upload)
+                        st.download_button( 
+                            label="Download predictions",
+                            data=open(path_prediction, 'r', encoding='utf-8').read(),
+                            file_name='predictions.conllu'
+                            )
+                        predictions = True
                 else:
                     st.text('Submit a text file to parse.')
 
+            # Follow the uploaded file being parsed in background
+            job = load_jobs(model_selected).get(st.session_state['job_id']) if not DEBUG and 'job_id' in st.session_state else None
+            if job is not None:
+                job_progress, job_download = st.empty(), st.empty()
+
         if predictions:
             row1mode2 = st.columns([1,28,1])
             with row1mode2[1]:
                 tab1mode2, tab2mode2 = st.tabs(["Sentences","Result"])
-                tab1mode2.text(open(path_text,"r").read())
+                tab1mode2.text(text_upload)
                 tab2mode2.text(open(path_prediction,"r").read())
+        elif job is not None:
+            row1mode2 = st.columns([1,28,1])
+            with row1mode2[1]:
+                tab1mode2, tab2mode2 = st.tabs(["Sentences","Result"])
+                tab1mode2.text(job.text)
+                job_result = tab2mode2.container()
 
 
                 
@@ -286,5 +345,6 @@ with rowall[1]:
             </svg></i></a><br>You may also contact the authors of the Portparser model.</p>',unsafe_allow_html=True)
 
 
-
-
+# Stream the predictions of the background job as its batches are parsed
+if job is not None:
+    stream_job(job, job_progress, job_download, job_result)
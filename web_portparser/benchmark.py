@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Portparser benchmark - replays a corpus through the whole pipeline
+#   (sentencer -> tokenizer -> embeddings -> UDPipe2) and measures how many
+#   sentences per second it sustains.
+#
+# The corpus is portTokenizer/sents.txt (or the given files, one sentence per
+#   line) plus optional synthetic sentences, made of words of the corpus with
+#   lengths drawn from a given distribution. The sentences are grouped into
+#   requests of `batch_size` sentences, sent by `concurrency` clients at once,
+#   for every combination of the given batch sizes and concurrencies.
+#
+# For each run it reports the throughput, the percentiles of the request
+#   latency, the peak RSS of the process and the time spent in each stage
+#   (see latency.py), and saves all the runs in a JSON file, which can be
+#   compared with the file of an earlier commit with --compare.
+#
+# Example of use:
+#
+#   python3 benchmark.py --batch_sizes 1 32 --concurrency 1 4 --synthetic 2000 --lengths uniform:5:40 --output bench.json
+#   python3 benchmark.py --tokenize_only --output bench_tok.json --compare bench_tok_old.json
+
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import pipeline
+from latency import STAGES, Timings, percentile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_corpus(paths):
+    sentences = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as corpus_file:
+            sentences.extend(line.strip() for line in corpus_file if line.strip())
+    return sentences
+
+
+def synthetic_sentences(corpus, count, lengths, seed):
+    """Sentences made of random words of the corpus, with lengths drawn from
+    'uniform:MIN:MAX' or 'normal:MEAN:STDDEV'."""
+    generator = random.Random(seed)
+    words = [word for sentence in corpus for word in sentence.split() if word.isalpha()]
+    distribution, *params = lengths.split(":")
+    sentences = []
+    for _ in range(count):
+        if distribution == "uniform":
+            length = generator.randint(int(params[0]), int(params[1]))
+        elif distribution == "normal":
+            length = round(generator.gauss(float(params[0]), float(params[1])))
+        else:
+            raise ValueError("Unknown length distribution '{}'".format(lengths))
+        sentence = [generator.choice(words) for _ in range(max(1, length))]
+        sentences.append(" ".join([sentence[0].capitalize()] + sentence[1:]) + ".")
+    return sentences
+
+
+def make_requests(sentences, batch_size, segment):
+    """Texts of `batch_size` sentences, as raw text to segment or one sentence per line."""
+    separator = " " if segment else "\n"
+    return [separator.join(sentences[i:i + batch_size]) + "\n" for i in range(0, len(sentences), batch_size)]
+
+
+def run(parser, requests, concurrency, segment, warmup):
+    """Send the requests from `concurrency` threads, returning the measures of each one."""
+    for text in requests[:warmup]:
+        parser(text, segment, Timings())
+
+    pending, results, mutex = list(reversed(requests)), [], threading.Lock()
+
+    def client():
+        while True:
+            with mutex:
+                if not pending:
+                    return
+                text = pending.pop()
+            timings = Timings()
+            start = time.perf_counter()
+            sentences, tokens = parser(text, segment, timings)
+            latency = time.perf_counter() - start
+            with mutex:
+                results.append((latency, timings, sentences, tokens))
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return time.perf_counter() - start, results
+
+
+def summarize(wall, results):
+    latencies = sorted(1000 * result[0] for result in results)
+    sentences, tokens = sum(result[2] for result in results), sum(result[3] for result in results)
+    stages = {}
+    for name in STAGES:
+        durations = sorted(1000 * timings[name] for _, timings, _, _ in results if name in timings)
+        if durations:
+            stages[name] = {"total": sum(durations), "p50": percentile(durations, 50), "p95": percentile(durations, 95),
+                            "p99": percentile(durations, 99)}
+    return {
+        "requests": len(results),
+        "sentences": sentences,
+        "tokens": tokens,
+        "wall_seconds": wall,
+        "sentences_per_second": sentences / wall,
+        "tokens_per_second": tokens / wall,
+        "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+                       "p99": percentile(latencies, 99), "max": latencies[-1]},
+        "stages_ms": stages,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(runs, path):
+    with open(path, "r", encoding="utf-8") as old_file:
+        old = json.load(old_file)
+    old_runs = {(run["batch_size"], run["concurrency"]): run for run in old["runs"]}
+    print("Compared with {} (commit {}):".format(path, old.get("commit")), file=sys.stderr)
+    for run in runs:
+        previous = old_runs.get((run["batch_size"], run["concurrency"]))
+        if previous is not None:
+            print("  batch {:4d} concurrency {:3d}: sentences/s {:+.1f}%, p95 latency {:+.1f}%".format(
+                run["batch_size"], run["concurrency"],
+                100 * (run["sentences_per_second"] / previous["sentences_per_second"] - 1),
+                100 * (run["latency_ms"]["p95"] / previous["latency_ms"]["p95"] - 1)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", default=[os.path.join(BASE_DIR, "portTokenizer", "sents.txt")], nargs="*", type=str,
+                        help="Files with one sentence per line")
+    parser.add_argument("--batch_sizes", default=[1, 32], nargs="+", type=int, help="Sentences per request")
+    parser.add_argument("--cache_size", default=0, type=int, help="Parse cache size (0 measures the parser itself)")
+    parser.add_argument("--compare", default=None, type=str, help="Results of an earlier run to compare with")
+    parser.add_argument("--concurrency", default=[1, 4], nargs="+", type=int, help="Clients sending requests at once")
+    parser.add_argument("--lengths", default="uniform:5:40", type=str, help="Synthetic lengths, 'uniform:MIN:MAX' or 'normal:MEAN:STDDEV'")
+    parser.add_argument("--model", default="Portparser_model", type=str, help="Parser model path")
+    parser.add_argument("--no_segment", default=False, action="store_true", help="Send one sentence per line, skipping the sentencer")
+    parser.add_argument("--output", default="benchmark.json", type=str, help="Results file")
+    parser.add_argument("--repeat", default=1, type=int, help="Times the corpus is replayed")
+    parser.add_argument("--seed", default=42, type=int, help="Random seed")
+    parser.add_argument("--synthetic", default=0, type=int, help="Synthetic sentences added to the corpus")
+    parser.add_argument("--threads", default=4, type=int, help="Threads of the models")
+    parser.add_argument("--tokenize_only", default=False, action="store_true", help="Run only the sentencer and the tokenizer")
+    parser.add_argument("--udpipe2_server", default=None, type=str, help="URL of a udpipe2_server to parse with")
+    parser.add_argument("--warmup", default=2, type=int, help="Requests sent before measuring")
+    parser.add_argument("--wembedding_model", default="bert-base-portuguese-cased-last4", type=str, help="WEmbeddings model")
+    parser.add_argument("--wembedding_server", default=None, type=str, help="Address of a WEmbeddings server")
+    args = parser.parse_args()
+
+    sentences = load_corpus(args.corpus)
+    sentences += synthetic_sentences(sentences, args.synthetic, args.lengths, args.seed)
+    sentences *= args.repeat
+
+    if args.tokenize_only:
+        def parse(text, segment, timings):
+            if segment:
+                with timings.stage("SEG"):
+                    text = pipeline.segment(text)
+            with timings.stage("TOK"):
+                parsed = pipeline.tokenize(text)
+            return len(parsed), sum(len(sentence.forms) for sentence in parsed)
+    else:
+        portparser = pipeline.PortparserPipeline(args.model, args.wembedding_model, threads=args.threads, cache_size=args.cache_size,
+                                                 udpipe2_server=args.udpipe2_server, wembedding_server=args.wembedding_server)
+
+        def parse(text, segment, timings):
+            if segment:
+                text = portparser.segment(text, timings=timings)
+            parsed = portparser.tokenize(text, timings=timings)
+            portparser.parse_sentences(parsed, timings)
+            return len(parsed), sum(len(sentence.forms) for sentence in parsed)
+
+    runs = []
+    for batch_size in args.batch_sizes:
+        for concurrency in args.concurrency:
+            wall, results = run(parse, make_requests(sentences, batch_size, not args.no_segment), concurrency,
+                                not args.no_segment, args.warmup)
+            runs.append(dict(batch_size=batch_size, concurrency=concurrency, **summarize(wall, results)))
+            print("batch {:4d} concurrency {:3d}: {:8.1f} sentences/s, {:9.1f} tokens/s, latency p50 {:.1f}ms p95 {:.1f}ms p99 {:.1f}ms,"
+                  " peak RSS {:.0f}MB".format(batch_size, concurrency, runs[-1]["sentences_per_second"], runs[-1]["tokens_per_second"],
+                                               *[runs[-1]["latency_ms"][p] for p in ["p50", "p95", "p99"]], runs[-1]["peak_rss_mb"]),
+                  file=sys.stderr)
+            print("  " + ", ".join("{} {:.1f}ms".format(name, stage["total"]) for name, stage in runs[-1]["stages_ms"].items()),
+                  file=sys.stderr)
+
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump({"commit": git_commit(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "args": vars(args), "runs": runs},
+                  output_file, indent=1)
+    if args.compare is not None:
+        compare(runs, args.compare)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Portparser spans check - verifies the offsets given by
+#   pipeline.segment_and_tokenize on the corpus and on noisy synthetic text
+#   (words of the corpus mixed with the marks, quotes, dashes and line breaks
+#   the sentencer rewrites), for every combination of match, trim and replace.
+#
+# For each text it checks that:
+#   - the sentences, their ids and their forms are the ones of
+#     pipeline.tokenize(pipeline.segment(text));
+#   - every span of a token reads back, in the text, as the token;
+#   - every span of a token is inside the span of its sentence, and the spans
+#     of the sentences follow each other without overlapping;
+#   - at least --coverage of the words (contracted words counted once) have a span.
+#
+# Example of use:
+#
+#   python3 check_spans.py --synthetic 300000 --coverage 0.95
+
+import argparse
+import os
+import random
+import sys
+
+import pipeline
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+NOISE = [" * ", " *", " | ", " >> ", " ‣ ", " ○ ", " — ", " – ", " “", "” ", " .", "\n", "\n\n", "\r\n", "\t", " ",
+         " (", ") ", " [", '"', "'", "...", "!", "?", ":", ";", ",", ". "]
+
+
+def noisy_text(corpus, size, seed):
+    """A text of about `size` characters of words of the corpus and noise."""
+    generator = random.Random(seed)
+    words = corpus.split()
+    pieces, length = [], 0
+    while length < size:
+        piece = generator.choice(NOISE) if generator.random() < 0.2 else " " + generator.choice(words)
+        pieces.append(piece)
+        length += len(piece)
+    return "".join(pieces)
+
+
+def check(text, match, trim, replace):
+    """The problems found in the spans of the text, the words and the words with a span."""
+    problems, words, located, last = [], 0, 0, 0
+    spanned = list(pipeline.segment_and_tokenize(text, 2048, replace, match, trim))
+    expected = pipeline.tokenize(pipeline.segment(text, 2048, replace), match, trim)
+    if [(sentence.text, [token[0] for token in sentence.tokens if token[1][0] != "c"]) for sentence in spanned] != \
+            [(sentence.text, sentence.forms) for sentence in expected]:
+        problems.append("the sentences differ from tokenize(segment(text))")
+    if [sentence.sid for sentence in spanned] != [sentence.conllu.split("# sent_id = ")[1].split("\n")[0] for sentence in expected]:
+        problems.append("the sentence ids differ from tokenize(segment(text))")
+    folded = text.translate(pipeline.FOLD) if replace else text
+    for sentence in spanned:
+        start, end = sentence.span
+        if start < last or end < start:
+            problems.append("{} span {} overlaps the previous sentence".format(sentence.sid, sentence.span))
+        last = end
+        i = 0
+        while i < len(sentence.tokens):
+            form, span = sentence.tokens[i][0], sentence.spans[i]
+            words += 1
+            if span is not None:
+                located += 1
+                if folded[span[0]:span[1]] != form:
+                    problems.append("{} token '{}' reads back as '{}'".format(sentence.sid, form, text[span[0]:span[1]]))
+                if span[0] < start or span[1] > end:
+                    problems.append("{} token '{}' span {} is out of the sentence {}".format(sentence.sid, form, span, sentence.span))
+            i += 3 if sentence.tokens[i][1][0] == "c" else 1
+    return problems, words, located
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("corpus", default=[os.path.join(BASE_DIR, "portTokenizer", "sents.txt")], nargs="*", type=str,
+                        help="Raw text files")
+    parser.add_argument("--coverage", default=0.95, type=float, help="Least fraction of the words with a span")
+    parser.add_argument("--seed", default=42, type=int, help="Random seed")
+    parser.add_argument("--synthetic", default=100000, type=int, help="Characters of noisy synthetic text")
+    args = parser.parse_args()
+
+    texts = []
+    for path in args.corpus:
+        with open(path, "r", encoding="utf-8", newline="") as corpus_file:
+            texts.append((path, corpus_file.read()))
+    texts.append(("synthetic", noisy_text(" ".join(text for _, text in texts), args.synthetic, args.seed)))
+
+    failed = False
+    for name, text in texts:
+        for match in [True, False]:
+            for trim in [True, False]:
+                for replace in [True, False]:
+                    problems, words, located = check(text, match, trim, replace)
+                    coverage = located / words if words else 1
+                    if coverage < args.coverage:
+                        problems.append("only {:.1%} of the words have a span".format(coverage))
+                    print("{} match={} trim={} replace={}: {} words, {:.2%} with a span, {}".format(
+                        name, match, trim, replace, words, coverage, "ok" if not problems else "{} problems".format(len(problems))),
+                        file=sys.stderr)
+                    for problem in problems[:10]:
+                        print("  " + problem, file=sys.stderr)
+                    failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
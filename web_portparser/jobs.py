@@ -0,0 +1,105 @@
+# Portparser jobs - background parsing of uploaded files
+#
+# Uploaded files are queued as jobs in a bounded queue and parsed batch by
+#   batch by a pool of worker threads sharing one PortparserPipeline, so that
+#   large uploads do not block the script run of the session which sent them.
+#   The interface polls the job by its id to report the progress and to offer
+#   the predictions once the job is done.
+#
+# Example of use:
+#
+#   jobs = JobQueue(pipeline, workers=1, max_queued=8)
+#   job_id = jobs.submit(raw_text, segment=True)
+#   job = jobs.get(job_id)
+#   print(job.status, job.done, job.total, job.eta())
+
+import queue
+import sys
+import threading
+import time
+import uuid
+
+from latency import Timings
+
+
+class Job:
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+    def __init__(self, text, segment=False):
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.segment = segment
+        self.status = self.QUEUED
+        self.done, self.total = 0, 0
+        self.chunks = []
+        self.error = None
+        self.submitted, self.started, self.finished = time.time(), None, None
+
+    def pending(self):
+        return self.status in [self.QUEUED, self.RUNNING]
+
+    def eta(self):
+        """Estimated seconds until the job is done, None while it cannot be estimated."""
+        if self.status != self.RUNNING or not self.done:
+            return None
+        return (time.time() - self.started) / self.done * (self.total - self.done)
+
+    def result(self):
+        return "".join(self.chunks)
+
+
+class JobQueue:
+    def __init__(self, pipeline, workers=1, max_queued=8, batch_size=64, keep=3600):
+        self._pipeline = pipeline
+        self._batch_size = batch_size
+        self._keep = keep
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._mutex = threading.Lock()
+
+        for _ in range(workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def submit(self, text, segment=False):
+        """Queue a text for parsing and return the job id; raises queue.Full
+        when too many jobs are already waiting. With `segment`, the text is raw
+        and is split into sentences by the worker."""
+        job = Job(text, segment)
+        with self._mutex:
+            self._forget_finished()
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._mutex:
+                del self._jobs[job.id]
+            raise
+        return job.id
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _forget_finished(self):
+        now = time.time()
+        for job_id in [job.id for job in self._jobs.values() if job.finished is not None and now - job.finished > self._keep]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.status, job.started = Job.RUNNING, time.time()
+            try:
+                timings = Timings()
+                if job.segment:
+                    job.text = self._pipeline.segment(job.text, timings=timings)
+                for done, total, chunk in self._pipeline.parse_batches(job.text, self._batch_size, timings):
+                    job.chunks.append(chunk)
+                    job.done, job.total = done, total
+                job.status = Job.DONE
+            except Exception as e:
+                import traceback
+                traceback.print_exc(file=sys.stderr)
+                sys.stderr.flush()
+                job.status, job.error = Job.FAILED, str(e)
+            job.finished = time.time()
+            self._queue.task_done()
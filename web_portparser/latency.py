@@ -0,0 +1,106 @@
+# Portparser latency - per stage durations of the parse requests
+#
+# The stages follow the split printed by udpipe2_server, extended with the
+#   steps done before the network:
+#
+#   SEG - sentence segmentation (portSent)
+#   TOK - tokenization (portTok)
+#   WE  - word embeddings
+#   DS  - dataset construction and batching
+#   NW  - network computation
+#   MST - maximum spanning tree decoding of the dependency heads
+#   RD  - writing and assembling the predicted CoNLL-U
+#
+# Example of use:
+#
+#   stats = LatencyStats(window=600)
+#   timings = Timings()
+#   with timings.stage("TOK"):
+#       sentences = tokenize(text)
+#   stats.record(timings, len(sentences), tokens)
+#   print(stats.summary())
+
+import collections
+import contextlib
+import math
+import sys
+import threading
+import time
+
+STAGES = ["SEG", "TOK", "WE", "DS", "NW", "MST", "RD"]
+
+
+class Timings(dict):
+    """Durations in seconds of the stages of one request."""
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, duration):
+        self[name] = self.get(name, 0.) + duration
+
+    def total(self):
+        return sum(self.values())
+
+
+def stage(timings, name):
+    """Time a stage into timings, or do nothing when timings is None."""
+    return timings.stage(name) if timings is not None else contextlib.nullcontext()
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class LatencyStats:
+    def __init__(self, window=600, max_requests=10000, log=True):
+        self._window = window
+        self._requests = collections.deque(maxlen=max_requests)
+        self._log = log
+        self._mutex = threading.Lock()
+
+    def record(self, timings, sentences, tokens):
+        now = time.time()
+        with self._mutex:
+            self._requests.append((now, dict(timings), sentences, tokens))
+        if self._log:
+            print("Request,", *["{} {:.2f}ms,".format(name, 1000 * timings[name]) for name in STAGES if name in timings],
+                  "total {:.2f}ms, {} sentences, {} tokens.".format(1000 * timings.total(), sentences, tokens),
+                  file=sys.stderr, flush=True)
+
+    def summary(self):
+        """Latency percentiles (in ms) per stage and throughput over the window."""
+        now = time.time()
+        with self._mutex:
+            while self._requests and now - self._requests[0][0] > self._window:
+                self._requests.popleft()
+            requests = list(self._requests)
+
+        stages = {}
+        for name in STAGES + ["total"]:
+            durations = sorted(1000 * (sum(timings.values()) if name == "total" else timings[name])
+                               for _, timings, _, _ in requests if name == "total" or name in timings)
+            if durations:
+                stages[name] = {"count": len(durations), "p50": percentile(durations, 50),
+                                "p95": percentile(durations, 95), "p99": percentile(durations, 99)}
+
+        sentences = sum(request[2] for request in requests)
+        tokens = sum(request[3] for request in requests)
+        elapsed = min(self._window, now - requests[0][0]) if requests else 0.
+        busy = sum(sum(timings.values()) for _, timings, _, _ in requests)
+        return {
+            "requests": len(requests),
+            "sentences": sentences,
+            "tokens": tokens,
+            "window": self._window,
+            "sentences_per_second": sentences / elapsed if elapsed else 0.,
+            "tokens_per_second": tokens / elapsed if elapsed else 0.,
+            "busy_sentences_per_second": sentences / busy if busy else 0.,
+            "stages": stages,
+        }
@@ -0,0 +1,89 @@
+# Portparser parse cache - predictions of already parsed sentences
+#
+# The cache keeps the predicted CoNLL-U of a sentence (its token lines, without
+#   the comments, which depend on the position of the sentence in the document)
+#   keyed by the identity of the model, the tokenizer options and the sentence
+#   text as normalized by the tokenizer (the '# text =' comment).
+#   The sentences live in an in-memory LRU of bounded size and, optionally, in
+#   an on-disk tier shared by all processes using the same directory.
+#
+# Example of use:
+#
+#   cache = ParseCache(model_identity("Portparser_model", "bert-base-portuguese-cased-last4"), 4096, "cache_dir")
+#   key = cache.key(text, match=True, trim=False)
+#   tokens = cache.get(key)
+#   if tokens is None: cache.put(key, tokens)
+
+import collections
+import hashlib
+import os
+import threading
+
+
+def model_identity(model_path, wembedding_model):
+    """Hash of the files defining the model and of the embeddings model name."""
+    identity = hashlib.sha1(wembedding_model.encode("utf-8"))
+    for name in ["options.json", "mappings.pickle", "weights.index"]:
+        if os.path.exists(os.path.join(model_path, name)):
+            with open(os.path.join(model_path, name), "rb") as model_file:
+                identity.update(model_file.read())
+    return identity.hexdigest()
+
+
+class ParseCache:
+    def __init__(self, identity, max_size=4096, directory=None):
+        self._identity = identity
+        self._max_size = max_size
+        self._directory = directory
+        self._sentences = collections.OrderedDict()
+        self._mutex = threading.Lock()
+        self.hits, self.misses = 0, 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, text, match, trim):
+        return hashlib.sha1("\t".join([self._identity, str(match), str(trim), text]).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._mutex:
+            tokens = self._sentences.get(key)
+            if tokens is not None:
+                self._sentences.move_to_end(key)
+                self.hits += 1
+                return tokens
+
+        if self._directory is not None and os.path.exists(self._path(key)):
+            with open(self._path(key), "r", encoding="utf-8") as cached_file:
+                tokens = cached_file.read()
+            self._remember(key, tokens)
+            with self._mutex:
+                self.hits += 1
+            return tokens
+
+        with self._mutex:
+            self.misses += 1
+        return None
+
+    def put(self, key, tokens):
+        self._remember(key, tokens)
+        if self._directory is not None:
+            os.makedirs(os.path.dirname(self._path(key)), exist_ok=True)
+            # Write to a private file first, so readers never see a partial sentence
+            tmp_path = "{}.{}.{}".format(self._path(key), os.getpid(), threading.get_ident())
+            with open(tmp_path, "w", encoding="utf-8") as cached_file:
+                cached_file.write(tokens)
+            os.replace(tmp_path, self._path(key))
+
+    def __len__(self):
+        return len(self._sentences)
+
+    def _remember(self, key, tokens):
+        with self._mutex:
+            self._sentences[key] = tokens
+            self._sentences.move_to_end(key)
+            while len(self._sentences) > self._max_size:
+                self._sentences.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self._directory, key[:2], key)
@@ -0,0 +1,355 @@
+# Portparser pipeline - keeps the sentencer, the tokenizer, the word embeddings
+#   and the parser resident in memory, so that each request pays only for the
+#   actual inference.
+#
+# The pipeline chains in memory the same steps that used to be run as separate
+#   processes by app.py, each one re-reading the file written by the previous:
+#
+#   portSent.py             - raw text -> text (one sentence per line)
+#   portTok.py              - text -> sentences with their tokens
+#   compute_wembeddings.py  - tokens -> contextualized word embeddings
+#   udpipe2.py --predict    - tokenized CoNLL-U + embeddings -> parsed CoNLL-U
+#
+# The embeddings and the parser can instead be computed by a WEmbeddings server
+#   and by a udpipe2_server.py (which computes the embeddings itself), shared by
+#   several front ends, see remote.py.
+#
+# Example of use:
+#
+#   pipeline = PortparserPipeline("Portparser_model", "bert-base-portuguese-cased-last4")
+#   conllu = pipeline.parse(pipeline.segment("Maria gosta de comer banana. Ele também."))
+#   print(pipeline.stats.summary())
+#
+# The models (udpipe2, with TensorFlow, and the WEmbeddings) are only imported
+#   when a PortparserPipeline loads them, so segment and tokenize (and the
+#   tokenize only benchmark) run without them.
+#
+# The sentencer and the tokenizer can also be fused, keeping for each token its
+#   offsets in the raw text (e.g. to highlight it), without the text with one
+#   sentence per line in between:
+#
+#   text = "Maria gosta do Rio — e Ele também!"
+#   for sentence in segment_and_tokenize(text):
+#       print(sentence.sid, [text[start:end] for start, end in filter(None, sentence.spans)])
+
+import argparse
+import collections
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+for directory in ["", "portSentencer", "portTokenizer", "udpipe2"]:
+    if os.path.join(BASE_DIR, directory) not in sys.path:
+        sys.path.append(os.path.join(BASE_DIR, directory))
+
+import portSent
+import portTok
+from latency import LatencyStats, Timings, stage
+from parse_cache import ParseCache, model_identity
+from remote import UDPipe2Client, WEmbeddingsClient
+
+# A tokenized sentence: its clean text, the forms of its words (the parts of the
+#   contracted words, without the contracted words themselves) and its CoNLL-U
+Sentence = collections.namedtuple("Sentence", ["text", "forms", "conllu"])
+
+
+def segment(text, limit=2048, replace=True):
+    """Split a raw text into sentences, returning them one per line."""
+    sentences = io.StringIO()
+    portSent.stripSents(io.StringIO(text, newline=None).read(), sentences, limit, replace)
+    return sentences.getvalue()
+
+
+def tokenize(text, match=True, trim=False, doc_id="input.conllu", sid="S0000"):
+    """Tokenize a text with one sentence per line, returning a list of Sentence."""
+    sentences = []
+    for SID, sent, tokens in portTok.tokenizeLines(io.StringIO(text, newline=None), match, trim, sid):
+        conllu = io.StringIO()
+        if not sentences:
+            print("# newdoc id = {}\n# newpar".format(doc_id), file=conllu)
+        portTok.printIt(tokens, sent, SID, conllu)
+        sentences.append(Sentence(sent, [token[0] for token in tokens if token[1][0] != "c"], conllu.getvalue()))
+    return sentences
+
+
+# A sentence of a raw text: its sentence id, its clean text, its tokens as given by
+#   portTok ([form, misc], a contracted word followed by its two parts), the
+#   (start, end) offsets in the raw text of the words it was segmented from and
+#   of each token. The parts of a contracted word have the span of the word, and
+#   the tokens that are not in the raw text (like a final "." added by the
+#   sentencer) have None
+SpannedSentence = collections.namedtuple("SpannedSentence", ["sid", "text", "tokens", "span", "spans"])
+
+# The one character replacements of the sentencer, applied to a copy of the raw
+#   text (without moving its offsets) so the chunks can be found in it
+FOLD = str.maketrans({old: new for old, new in portSent.REPLACEABLES if len(old) == 1 and len(new) == 1})
+# The characters between the chunks, and the marks the sentencer turns into a "."
+#   joined to the previous chunk (e.g. "a *b" is the chunk "a.b")
+BLANKS = " \t\n\r"
+MARKS = [">>", "‣", "○", "*", "|"]
+# The characters the cleaning of a sentence (cleanSent, cleanIt) may remove from a word
+PAIRED = str.maketrans("", "", "\"'()[]{}<>")
+
+
+def chunk_spans(folded, chunks):
+    """Yield each chunk of the sentencer with its (start, end) offsets in the
+    folded raw text, as the chunks are made (see portSent.chunksOf)."""
+    p = 0
+    for chunk in chunks:
+        while p < len(folded) and folded[p] in BLANKS:
+            p += 1
+        start = p
+        if folded.startswith(chunk, p):
+            p += len(chunk)
+        else:
+            # The chunk joins words of the text through a mark turned into a "."
+            i = 0
+            while i < len(chunk) and p < len(folded):
+                if folded[p] == chunk[i]:
+                    i += 1
+                    p += 1
+                else:
+                    mark = [mark for mark in MARKS if chunk[i] == "." and folded.startswith(mark, p)]
+                    i += 1 if mark else 0
+                    p += len(mark[0]) if mark else 1
+        yield chunk, start, p
+
+
+def word_key(word):
+    """What the cleaning of a sentence keeps of a word: its letters and digits or,
+    if it has none, its characters but the quotes and brackets."""
+    key = "".join(c for c in word if c.isalnum())
+    return key if key != "" else word.translate(PAIRED)
+
+
+def align_words(words, chunks):
+    """The index in `chunks` of each word of a clean sentence, None if the word is
+    not one of them. The words are aligned from the last one, as trim removes
+    words at the beginning, and a word only skips chunks without letters or digits
+    (removed by the cleaning)."""
+    keys = [word_key(chunk[0]) for chunk in chunks]
+    aligned, j = [None] * len(words), len(chunks)
+    for k in range(len(words) - 1, -1, -1):
+        key = word_key(words[k])
+        for i in range(j - 1, -1, -1):
+            if keys[i] == key:
+                aligned[k], j = i, i
+                break
+            elif any(c.isalnum() for c in keys[i]):
+                break
+    return aligned
+
+
+def segment_and_tokenize(text, limit=2048, replace=True, match=True, trim=False, sid="S0000"):
+    """Split a raw text into sentences and tokenize them in memory, yielding a
+    SpannedSentence for each one, with its offsets in `text`."""
+    # The sentencer sees the line breaks as `segment` does, "\r" and "\r\n" as "\n"
+    pieces = portSent.textPieces([io.StringIO(text.replace("\r", "\n") if "\r" in text else text)], 65536)
+    folded = text.translate(FOLD) if replace else text
+    # The chunks read by the sentencer and not yet in a sentence, with their offsets
+    pending = collections.deque()
+
+    def chunks():
+        for chunk, start, end in chunk_spans(folded, portSent.chunksOf(pieces, replace)):
+            pending.append((chunk, start, end))
+            yield chunk
+
+    for sent in portSent.splitSents(chunks(), limit):
+        # The chunks of the sentence, without the ones longer than the limit (dropped),
+        #   the first one may have lost its first character (sentence cut by the limit)
+        sentChunks = []
+        for k, word in enumerate(sent.split(" ")):
+            while pending and pending[0][0] != word and not (k == 0 and pending[0][0][1:] == word):
+                pending.popleft()
+            if pending:
+                sentChunks.append(pending.popleft())
+        sent = portSent.cleanSent(sent)
+        if sent is None:
+            continue
+        sid = portTok.nextName(sid)
+        sent = portTok.cleanIt(sent, match, trim)
+        if sent == "":
+            continue
+        tokens = portTok.splitIt(sent, sid)
+        span = (sentChunks[0][1], sentChunks[-1][2]) if sentChunks else (0, 0)
+        # The region of each word of the sentence: its chunk or, if it has none,
+        #   the text between the chunks of its neighbours
+        words = sent.split(" ")
+        aligned = align_words(words, sentChunks)
+        regions = [None if i is None else sentChunks[i][1:] for i in aligned]
+        for k in range(len(words)):
+            if regions[k] is None:
+                before = [region[1] for region in regions[:k] if region is not None]
+                after = [region[0] for region in regions[k + 1:] if region is not None]
+                regions[k] = (before[-1] if before else span[0], after[0] if after else span[1])
+        # Each token is searched in the region of its word (the forms of the words
+        #   as they are in the text, the contracted words but not their parts, make up
+        #   each word), one not found does not move the search
+        spans, i, k, filled, cursor = [], 0, 0, 0, regions[0][0]
+        while i < len(tokens):
+            form = tokens[i][0]
+            while k + 1 < len(words) and filled >= len(words[k]):
+                k, filled = k + 1, 0
+                cursor = regions[k][0]
+            at = folded.find(form, cursor, regions[k][1])
+            if at >= 0:
+                cursor = at + len(form)
+            filled += len(form)
+            width = 3 if tokens[i][1][0] == "c" else 1
+            spans.extend([None if at < 0 else (at, at + len(form))] * width)
+            i += width
+        yield SpannedSentence(sid, sent, tokens, span, spans)
+
+
+class PortparserPipeline:
+    def __init__(self, model_path, wembedding_model, threads=4, batch_size=32, wembedding_batch_size=64,
+                 match=True, trim=False, cache_size=0, cache_dir=None, stats_window=600,
+                 udpipe2_server=None, udpipe2_model=None, wembedding_server=None, pool_size=4, timeout=120, retries=2):
+        self._wembedding_model = wembedding_model
+        self._wembedding_batch_size = wembedding_batch_size
+        self._match, self._trim = match, trim
+        # Predictions of repeated sentences, shared by all requests of the process
+        self.cache = None
+        if cache_size:
+            identity = wembedding_model if udpipe2_server is None else "{} {} {}".format(wembedding_model, udpipe2_server, udpipe2_model)
+            self.cache = ParseCache(model_identity(model_path, identity), cache_size, cache_dir)
+        # The network and the session are shared by all requests of the process
+        self._mutex = threading.Lock()
+        # Durations of the stages of the last requests
+        self.stats = LatencyStats(window=stats_window)
+
+        # Parse with a udpipe2_server, nothing to load
+        self._server = None
+        if udpipe2_server is not None:
+            self._server = UDPipe2Client(udpipe2_server, udpipe2_model, pool_size, timeout, retries)
+            print("Using the udpipe2_server at {}".format(udpipe2_server), file=sys.stderr, flush=True)
+            return
+
+        # Load the word embeddings model, or connect to the WEmbeddings server
+        if wembedding_server is not None:
+            self._wembeddings = WEmbeddingsClient(wembedding_server, pool_size, timeout, retries)
+            self._wembeddings_mutex = contextlib.nullcontext()
+        else:
+            import wembedding_service.wembeddings.wembeddings as wembeddings
+            self._wembeddings = wembeddings.WEmbeddings(threads=threads, preload_models=[wembedding_model])
+            self._wembeddings_mutex = self._mutex
+
+        # Load the parser network
+        import udpipe2
+        import udpipe2_dataset
+        with open(os.path.join(model_path, "options.json"), mode="r") as options_file:
+            self._args = argparse.Namespace(**json.load(options_file))
+        udpipe2.UDPipe2.postprocess_arguments(self._args)
+        self._args.batch_size = batch_size
+
+        self._train = udpipe2_dataset.UDPipe2Dataset.load_mappings(os.path.join(model_path, "mappings.pickle"))
+        self._network = udpipe2.UDPipe2(threads=threads)
+        self._network.construct(self._args, self._train, [], [], predict_only=True)
+        self._network.load(model_path, self._args.morphodita)
+
+        print("Loaded Portparser pipeline from {}".format(model_path), file=sys.stderr, flush=True)
+
+    def segment(self, text, limit=2048, replace=True, timings=None):
+        """Split a raw text into sentences, returning them one per line."""
+        with stage(timings, "SEG"):
+            return segment(text, limit, replace)
+
+    def segment_and_tokenize(self, text, limit=2048, replace=True, sid="S0000"):
+        """Split a raw text into sentences and tokenize them, yielding a SpannedSentence
+        for each one, with the offsets of its tokens in `text`."""
+        return segment_and_tokenize(text, limit, replace, self._match, self._trim, sid)
+
+    def tokenize(self, text, doc_id="input.conllu", sid="S0000", timings=None):
+        """Tokenize a text with one sentence per line, returning a list of Sentence."""
+        with stage(timings, "TOK"):
+            return tokenize(text, self._match, self._trim, doc_id, sid)
+
+    def embed(self, sentences, timings=None):
+        """Compute the word embeddings of the given sentences."""
+        embeddings = []
+        with self._wembeddings_mutex, stage(timings, "WE"):
+            for i in range(0, len(sentences), self._wembedding_batch_size):
+                batch = self._wembeddings.compute_embeddings(
+                    self._wembedding_model, [sentence.forms for sentence in sentences[i:i + self._wembedding_batch_size]])
+                embeddings.extend(sentence_embeddings.astype(np.float16) for sentence_embeddings in batch)
+        return embeddings
+
+    def predict(self, sentences, embeddings, timings=None):
+        """Tag and parse the given sentences with the given embeddings, returning them in CoNLL-U."""
+        import udpipe2_dataset
+        with stage(timings, "DS"):
+            dataset = udpipe2_dataset.UDPipe2Dataset(text="".join(sentence.conllu for sentence in sentences), train=self._train,
+                                                     shuffle_batches=False, embeddings=embeddings)
+        with self._mutex:
+            return self._network.predict(dataset, False, self._args, timings)
+
+    def process(self, sentences, timings=None):
+        """Tag and parse the given sentences, locally or by the udpipe2_server."""
+        if self._server is not None:
+            with stage(timings, "NW"):
+                return self._server.process("".join(sentence.conllu for sentence in sentences))
+        return self.predict(sentences, self.embed(sentences, timings), timings)
+
+    @staticmethod
+    def split(conllu):
+        """Split a CoNLL-U document into its sentences, each one with its comments."""
+        return [sentence + "\n\n" for sentence in conllu.split("\n\n")
+                if any(line[:1].isdigit() for line in sentence.split("\n"))]
+
+    def parse_sentences(self, sentences, timings=None):
+        """Tag and parse a list of Sentence (as returned by `tokenize`), taking
+        the sentences already parsed from the cache, if there is one."""
+        if self.cache is None:
+            return self.process(sentences, timings)
+
+        with stage(timings, "RD"):
+            keys = [self.cache.key(sentence.text, self._match, self._trim) for sentence in sentences]
+            tokens = [self.cache.get(key) for key in keys]
+
+        # Parse each missing sentence once, even if it is repeated in the batch
+        missing = {}
+        for i in range(len(sentences)):
+            if tokens[i] is None:
+                missing.setdefault(keys[i], sentences[i])
+        if missing:
+            predicted = {}
+            conllu = self.process(list(missing.values()), timings)
+            with stage(timings, "RD"):
+                for key, sentence in zip(missing, self.split(conllu)):
+                    predicted[key] = "".join(line + "\n" for line in sentence.split("\n")[:-2] if not line.startswith("#"))
+                    self.cache.put(key, predicted[key])
+                for i in range(len(sentences)):
+                    if tokens[i] is None:
+                        tokens[i] = predicted[keys[i]]
+
+        # The comments of the sentences (sent_id, newdoc) come from the current document
+        with stage(timings, "RD"):
+            return "".join("".join(line + "\n" for line in sentences[i].conllu.split("\n") if line.startswith("#")) + tokens[i] + "\n"
+                           for i in range(len(sentences)))
+
+    def record(self, timings, sentences):
+        """Add the durations of a finished request to the statistics."""
+        self.stats.record(timings, len(sentences), sum(len(sentence.forms) for sentence in sentences))
+
+    def parse(self, text):
+        """Run the whole pipeline on a text with one sentence per line."""
+        timings = Timings()
+        sentences = self.tokenize(text, timings=timings)
+        conllu = self.parse_sentences(sentences, timings)
+        self.record(timings, sentences)
+        return conllu
+
+    def parse_batches(self, text, batch_size=64, timings=None):
+        """Run the whole pipeline batch by batch, yielding the number of sentences
+        parsed so far, the total number of sentences and the CoNLL-U of the batch."""
+        timings = Timings() if timings is None else timings
+        sentences = self.tokenize(text, timings=timings)
+        for i in range(0, len(sentences), batch_size):
+            yield min(i + batch_size, len(sentences)), len(sentences), self.parse_sentences(sentences[i:i + batch_size], timings)
+        self.record(timings, sentences)
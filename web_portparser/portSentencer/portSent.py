@@ -6,9 +6,11 @@
 # Opções:
 #
 # -h help
-# -o output file
+# -o output file ('-' for the standard output)
 # -r replace non standart characters
 # -l limit the number of characters per sentence
+# -j number of parallel processes (jobs), each input file is a document apart
+# -n marks the beginning of each document with '# newdoc id = file'
 #
 # Exemplo de utilização:
 #
@@ -19,26 +21,52 @@
 #   gera sentenças com limite máximo de 2048 carateres e
 #   salva as sentenças no arquivo 'sents.txt'
 #
+# Os arquivos de entrada são lidos aos poucos, como um único texto, e a
+#   memória usada é limitada pela maior sentença (ou pelo limite -l).
+#
+# Exemplo de utilização em pipeline (entrada '-' lida da entrada padrão,
+#   linha a linha, e cada sentença escrita na saída padrão assim que termina):
+#
+# cat text1.txt | portSent -r -l 2048 - | portTok -m -t -
+#
+# Exemplo de utilização com documentos à parte (arquivos de notícias, por
+#   exemplo), sentenciados por 4 processos paralelos em trechos cortados entre
+#   linhas onde a sentença termina de qualquer modo, com as sentenças escritas
+#   na ordem da entrada, cada documento precedido de '# newdoc id = arquivo':
+#
+# portSent -o sents.txt -r -l 2048 -j 4 -n noticias/*.txt
+#
 # last edit: 01/21/2024
 # created by Lucelene Lopes - lucelene@gmail.com
 
-import sys, os
+import sys, os, io
+import multiprocessing
+# normalization shared with portTok (portTokenizer/portText.py)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "portTokenizer"))
+import portText
 
 #################################################
 ### Captura de argumentos da linha de comando
 #################################################
 def parseOptions(arguments):
     # default options
-    output_file, input_files, replace, limit = "", [], False, 0
+    output_file, input_files, replace, limit, jobs, newdoc = "", [], False, 0, 1, False
     i = 1
     while i < len(arguments):
-        if (arguments[i][0] == "-"):
+        # entrada padrão (stdin) como arquivo de entrada
+        if (arguments[i] == "-"):
+            input_files.append("-")
+            i += 1
+        elif (arguments[i][0] == "-"):
             # ajuda (help) - mostra ajuda, nada é executado
             if ((arguments[i][1] == "h") and (len(arguments[i])==2)) or \
                (arguments[i] == "-help"):
                 print("Opções:\n-h ajuda\n-o arquivo de saída", \
                       "-r substitui caracteres não padrão", \
                       "-l limite de caracteres por sentença", \
+                      "-j número de processos paralelos (cada arquivo é um documento à parte)", \
+                      "-n marca o início de cada documento com '# newdoc id = arquivo'", \
+                      "- como arquivo de entrada lê da entrada padrão, -o - escreve na saída padrão", \
                       " -demais opções ignoradas, por favor execute novamente sem opção de ajuda",
                       "Exemplo de utilização:", \
                       "portSent -o sents.txt -r -l 2048 text1.txt text2.txt", \
@@ -62,6 +90,20 @@ def parseOptions(arguments):
                 except:
                     print("limite de caracteres por sentença não informado - assumindo sem limite")
                     i += 1
+            # opção de número de processos paralelos (jobs)
+            elif ((arguments[i][1] == "j") and (len(arguments[i])==2)) or \
+                 (arguments[i] == "-jobs"):
+                try:
+                    jobs = int(arguments[i+1])
+                    i += 2
+                except:
+                    print("número de processos paralelos inválido - assumindo 1")
+                    i += 2
+            # opção de marcação dos documentos (newdoc)
+            elif ((arguments[i][1] == "n") and (len(arguments[i])==2)) or \
+                 (arguments[i] == "-newdoc"):
+                newdoc = True
+                i += 1
             # opção de arquivo de saída (um nome de arquivo)
             elif ((arguments[i][1] == "o") and (len(arguments[i])==2)) or \
                  (arguments[i] == "-output"):
@@ -79,133 +121,274 @@ def parseOptions(arguments):
             else:
                 print("O arquivo {} não foi encontrado (ignorado)".format(arguments[i]))
                 i += 1
-    return [output_file, input_files, limit, replace]
+    return [output_file, input_files, limit, replace, jobs, newdoc]
 
 #################################################
-### função stripSents - faz de fato o sentenciamento
+### normalização do texto - substitui caracteres não usuais, quebras de linha,
+###    tabulações e espaços repetidos
 #################################################
-def stripSents(inputText, outfile, limit, replace):
-    def cleanPrint(sent, outfile):
-        # do not print empty sentences
-        if (sent == "") or (sent == ".") or (sent == ".."):
-            return 0
-        # remove second . in sentences ending by ..
-        elif (len(sent) > 2) and (sent[-3:] != "...") and (sent[-2:] == ".."):
-            print(sent[:-1], file=outfile)
-            return 1
-        # insert . in sentences not ending by punctuation
-        elif (sent[-1] not in [".", "!", "?", ":", ";"]) and \
-            not ((sent[-1] in ["'", '"']) and (sent[-2] in [".", "!", "?"])):
-            print(sent+".", file=outfile)
-            return 1
-        # remove encompassing quotations " or ' if the quotations do not appear inside the sentence
-        elif (sent[0] == sent[1]) and ((sent[0] == "'") or (sent[0] == '"')) and (sent.count(sent[0]) == 2):
-            print(sent[1:-1], file=outfile)
-            return 1
-        # otherwise print it as it is
-        else:
-            print(sent, file=outfile)
-            return 1
-    def isAbbrev(chunk, abbrev):
-        abbr = False
-        for a in abbrev:
-            if (chunk == a):
-                abbr = True
+REPLACEABLES = [["\xa0", " "], \
+                ["—", "-"], ["–", "-"], \
+                ['＂', '"'], \
+                ['“', '"'], ['”', '"'], \
+                ['‟', '"'], ['″', '"'], \
+                ['‶', '"'], ['〃', '"'], \
+                ['״', '"'], ['˝', '"'], \
+                ['ʺ', '"'], ['˶', '"'], \
+                ['ˮ', '"'], ['ײ', '"'], \
+                [" ‣", "."], [" >>", "."], [" ○", "."], [" *", "."], \
+                [" | ", ". "], [" .", "."], \
+                ["\n", " "], ["\t", " "]]
+ABBREV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abbrev.txt")
+
+NORMALIZERS = {True: portText.Normalizer([["  ", " "]] + REPLACEABLES, collapse=True), \
+               False: portText.Normalizer([["  ", " "], ["\n", " "], ["\t", " "]], collapse=True)}
+# characters that may be changed by the normalization, the text is only cut between two other characters
+PATTERN_CHARS = NORMALIZERS[True].chars
+
+def normalizeIt(text, replace):
+    return NORMALIZERS[replace](text)
+
+#################################################
+### função textPieces - lê os arquivos de entrada aos poucos, como um único texto
+###    cortado em pedaços só entre dois caracteres não afetados pela normalização
+###    (assim a normalização de cada pedaço é idêntica à do texto inteiro)
+#################################################
+def textPieces(infiles, size, lines=False):
+    carry = ""
+    for infile in infiles:
+        while True:
+            # reading lines, the text typed (or piped) is processed as soon as it arrives
+            if (lines):
+                piece = infile.readline(size)
+            else:
+                piece = infile.read(size)
+            if (piece == ""):
                 break
+            piece = carry + piece
+            cut = len(piece)-1
+            while (cut > max(0, len(carry)-1)) and ((piece[cut] in PATTERN_CHARS) or (piece[cut-1] in PATTERN_CHARS)):
+                cut -= 1
+            if (cut > max(0, len(carry)-1)):
+                yield piece[:cut]
+                carry = piece[cut:]
             else:
-                lasts = -len(a)
-                if (chunk[lasts:] == a) and (not chunk[lasts-1].isalpha()):
-                    abbr = True
-                    break
-        return abbr
-    # the function stripSents main body
-    abbrev = []
-    infile = open("abbrev.txt", "r")
-    for line in infile:
-        abbrev.append(line[:-1])
-    infile.close()
-    if (replace):
-        replaceables = [[" ", " "], \
-                        ["—", "-"], ["–", "-"], \
-                        ['＂', '"'], \
-                        ['“', '"'], ['”', '"'], \
-                        ['‟', '"'], ['″', '"'], \
-                        ['‶', '"'], ['〃', '"'], \
-                        ['״', '"'], ['˝', '"'], \
-                        ['ʺ', '"'], ['˶', '"'], \
-                        ['ˮ', '"'], ['ײ', '"'], \
-                        [" ‣", "."], [" >>", "."], [" ○", "."], [" *", "."], \
-                        [" | ", ". "], [" .", "."], \
-                        ["\n", " "], ["\t", " "]]
+                carry = piece
+    if (carry != ""):
+        yield carry
+
+#################################################
+### função chunksOf - os pedaços (palavras separadas por espaços) do texto normalizado
+#################################################
+def chunksOf(pieces, replace):
+    partial = ""
+    for piece in pieces:
+        bits = (partial + normalizeIt(piece, replace)).split(" ")
+        partial = bits.pop()
+        for b in bits:
+            if (b != ""):
+                yield b
+    if (partial != ""):
+        yield partial
+
+#################################################
+### função cleanSent - acerta o final de uma sentença (None para não imprimi-la)
+#################################################
+def cleanSent(sent):
+    # do not print empty sentences
+    if (sent == "") or (sent == ".") or (sent == ".."):
+        return None
+    # remove second . in sentences ending by ..
+    elif (len(sent) > 2) and (sent[-3:] != "...") and (sent[-2:] == ".."):
+        return sent[:-1]
+    # insert . in sentences not ending by punctuation
+    elif (sent[-1] not in [".", "!", "?", ":", ";"]) and \
+        not ((sent[-1] in ["'", '"']) and (sent[-2] in [".", "!", "?"])):
+        return sent+"."
+    # remove encompassing quotations " or ' if the quotations do not appear inside the sentence
+    elif (sent[0] == sent[1]) and ((sent[0] == "'") or (sent[0] == '"')) and (sent.count(sent[0]) == 2):
+        return sent[1:-1]
+    # otherwise print it as it is
     else:
-        replaceables = [["\n", " "], ["\t", " "]]
-    tmp = inputText.replace("  "," ")
-    for r in replaceables:
-        tmp = tmp.replace(r[0], r[1])
-    while (tmp.find("  ") != -1):
-        tmp = tmp.replace("  "," ")
-    if (tmp[0] == " "):
-        tmp = tmp[1:]
-    bagOfChunks = tmp.split(" ")
-    s, sent = 0, ""
-    if (bagOfChunks[-1] == ""):
-        bagOfChunks.pop()
-    for i in range(len(bagOfChunks)):
-        # if it is the last chunk, it is the end of sentence
-        if (i == len(bagOfChunks)-1):
-            sent += " " + bagOfChunks[i]
-            s += cleanPrint(sent[1:], outfile)
-            break
-        chunk = bagOfChunks[i]
+        return sent
+
+#################################################
+### função endsSent - um pedaço (de 3 ou mais caracteres) seguido de nextChunk
+###    termina uma sentença?
+#################################################
+def endsSent(chunk, nextChunk, abbrev):
+    # ! ? or ... always mark an end of sentence
+    if (chunk[-3:] == "...") or (chunk[-1] == "!") or (chunk[-1] == "?"):
+        return True
+    # a . : or ; followed by a lowercase chunk is not an end of sentence
+    elif ((chunk[-1] == ".") or (chunk[-1] == ":") or (chunk[-1] == ";")) and (nextChunk[0].islower()):
+        return False
+    # a : or ; not followed by a lowercase chunk is an end of sentence
+    elif ((chunk[-1] == ":") or (chunk[-1] == ";")) and (not nextChunk[0].islower()):
+        return True
+    # chunk ends with ! or ? followed by quotations that had appear before an odd number is an end of sentence
+    elif (chunk[-2:] in ["!'", '!"', "?'", '?"']):
+        return True
+    elif (chunk[-2:] in [".'", '."']):
+        return not abbrev.isAbbrev(chunk[:-1])
+    # a chunk not ending with ! ? ... ; : or . is not an end of sentence
+    elif (chunk[-1] != "."):
+        return False
+    # chunk ending by . is either a know abbreviation (not an end of sentence), or an end of sentence
+    else:
+        return not abbrev.isAbbrev(chunk)
+
+#################################################
+### função splitSents - faz de fato o sentenciamento, gera as sentenças de uma
+###    sequência de pedaços, guardando apenas a sentença em construção
+#################################################
+def splitSents(chunks, limit):
+    # the abbreviations index (read once), shared with portTok (see portText.py)
+    abbrev = portText.abbrevIndex(ABBREV_FILE)
+    sent, chunk = "", None
+    # each chunk is decided knowing the next one
+    for nextChunk in chunks:
+        if (chunk == None):
+            chunk = nextChunk
+            continue
         # if there is a limit and the chunk is greater than the limit, discard it
         if (limit != 0) and (len(chunk) > limit):
-            continue
+            pass
         # if there is a limit and it is reached, ends the sentence arbitrarily
         elif (limit != 0) and (len(sent) + len(chunk) > limit):
-            s += cleanPrint(sent[1:], outfile)
+            yield sent[1:]
             sent = chunk
         # if the chunk is too short
         elif (len(chunk) < 3) and (len(chunk) != 0):
             sent += " " + chunk
         # if the chunk is empty
         elif (len(chunk) == 0):
-            continue
-        # ! ? or ... always mark an end of sentence
-        elif (chunk[-3:] == "...") or (chunk[-1] == "!") or (chunk[-1] == "?"):
-            sent += " " + chunk
-            s += cleanPrint(sent[1:], outfile)
-            sent = ""
-        # a . : or ; followed by a lowercase chunk is not an end of sentence
-        elif ((chunk[-1] == ".") or (chunk[-1] == ":") or (chunk[-1] == ";")) and (bagOfChunks[i+1][0].islower()):
-            sent += " " + chunk
-        # a : or ; not followed by a lowercase chunk is an end of sentence
-        elif ((chunk[-1] == ":") or (chunk[-1] == ";")) and (not bagOfChunks[i+1][0].islower()):
-            sent += " " + chunk
-            s += cleanPrint(sent[1:], outfile)
-            sent = ""
-        # chunk ends with ! or ? followed by quotations that had appear before an odd number is an end of sentence
-        elif (chunk[-2:] in ["!'", '!"', "?'", '?"']):
-            sent += " " + chunk
-            s += cleanPrint(sent[1:], outfile)
-            sent = ""
-        elif (chunk[-2:] in [".'", '."']):
+            pass
+        else:
             sent += " " + chunk
-            abbr = isAbbrev(chunk[:-1], abbrev)
-            if not abbr:
-                s += cleanPrint(sent[1:], outfile)
+            if (endsSent(chunk, nextChunk, abbrev)):
+                yield sent[1:]
                 sent = ""
-        # a chunk not ending with ! ? ... ; : or . is not an end of sentence
-        elif (chunk[-1] != "."):
-            sent += " " + chunk
-        # chunk ending by . is either a know abbreviation (not an end of sentence), or an end of sentence
-        elif (chunk[-1] == "."):
-            abbr = isAbbrev(chunk, abbrev)
-            if (abbr):
-                sent += " " + chunk
+        chunk = nextChunk
+    # the last chunk is the end of sentence
+    if (chunk != None):
+        sent += " " + chunk
+        yield sent[1:]
+
+#################################################
+### função stripStream - sentenciamento dos arquivos de entrada (como um único
+###    texto) lidos aos poucos, com memória limitada pela maior sentença
+#################################################
+def stripStream(infiles, outfile, limit, replace, flush=False, size=65536):
+    s = 0
+    for sent in splitSents(chunksOf(textPieces(infiles, size, lines=flush), replace), limit):
+        sent = cleanSent(sent)
+        if (sent != None):
+            print(sent, file=outfile)
+            s += 1
+            if (flush):
+                outfile.flush()
+    # return the number of generated sentences
+    return s
+
+#################################################
+### função stripSents - sentenciamento de um texto
+#################################################
+def stripSents(inputText, outfile, limit, replace):
+    return stripStream([io.StringIO(inputText)], outfile, limit, replace)
+
+#################################################
+### função docUnits - lê um documento linha a linha em trechos de cerca de size
+###    caracteres, cortados só entre duas linhas onde a sentença termina de
+###    qualquer modo (cada trecho pode ser sentenciado à parte)
+#################################################
+def docUnits(infile, size, replace):
+    abbrev = portText.abbrevIndex(ABBREV_FILE)
+    lines, length, last = [], 0, None
+    for line in infile:
+        chunks = [b for b in normalizeIt(line, replace).split(" ") if (b != "")]
+        if (chunks != []):
+            if (length >= size) and (last != None) and (len(last) >= 3) and (endsSent(last, chunks[0], abbrev)):
+                yield "".join(lines)
+                lines, length = [], 0
+            last = chunks[-1]
+        lines.append(line)
+        length += len(line)
+    if (lines != []):
+        yield "".join(lines)
+
+#################################################
+### função stripUnit - sentenciamento de um trecho (executada pelos processos
+###    paralelos), a última sentença maior que o limite indica que o corte do
+###    trecho não é um fim de sentença (o limite a cortaria antes)
+#################################################
+def stripUnit(text, limit, replace):
+    sents, cut = [], True
+    for sent in splitSents(chunksOf([text], replace), limit):
+        cut = (limit == 0) or (len(sent) <= limit)
+        sent = cleanSent(sent)
+        if (sent != None):
+            sents.append(sent)
+    return sents, cut
+
+#################################################
+### função stripDocs - sentenciamento de cada arquivo de entrada como um documento
+###    à parte, com jobs processos paralelos, escrevendo as sentenças na ordem
+###    da entrada (precedidas de '# newdoc id = arquivo', se newdoc)
+#################################################
+def stripDocs(inputs, outfile, limit, replace, jobs=1, newdoc=False, size=65536):
+    def units():
+        for i in range(len(inputs)):
+            if (inputs[i] == "-"):
+                infile = sys.stdin
             else:
-                sent += " " + chunk
-                s += cleanPrint(sent[1:], outfile)
-                sent = ""
+                infile = open(inputs[i], "r")
+            for text in docUnits(infile, size, replace):
+                yield i, text
+            if (infile != sys.stdin):
+                infile.close()
+            yield i, None
+    s, doc, held, heldSents = 0, -1, "", []
+    if (jobs > 1):
+        pool = multiprocessing.Pool(jobs)
+    try:
+        todo, pending = units(), []
+        while True:
+            # keep two units per process under way, so the input is not read all at once
+            for i, text in todo:
+                if (text != None) and (jobs > 1):
+                    pending.append([i, text, pool.apply_async(stripUnit, (text, limit, replace))])
+                else:
+                    pending.append([i, text, None])
+                if (len(pending) >= 2*jobs):
+                    break
+            if (pending == []):
+                break
+            i, text, result = pending.pop(0)
+            if (newdoc) and (i != doc):
+                print("# newdoc id = {}".format("stdin" if inputs[i] == "-" else inputs[i]), file=outfile)
+                doc = i
+            # the end of the document ends the unit held
+            if (text == None):
+                sents, cut = heldSents, True
+            # a unit held (not cut at an end of sentence) is sentenced again with the next one, here
+            elif (held != "") or (result == None):
+                text = held + text
+                sents, cut = stripUnit(text, limit, replace)
+            else:
+                sents, cut = result.get()
+            if (cut):
+                for sent in sents:
+                    print(sent, file=outfile)
+                s += len(sents)
+                held, heldSents = "", []
+                outfile.flush()
+            else:
+                held, heldSents = text, sents
+    finally:
+        if (jobs > 1):
+            pool.close()
+            pool.join()
     # return the number of generated sentences
     return s
 
@@ -214,29 +397,46 @@ def stripSents(inputText, outfile, limit, replace):
 #################################################
 def portSent():
     if (len(sys.argv) == 1):
-        arguments = ["sents2.txt", ["Teste_Reli.txt"], 0, True]
+        arguments = ["sents2.txt", ["Teste_Reli.txt"], 0, True, 1, False]
         print("Assumindo default: 'sents.txt' como arquivo de saída, 'text1.txt' como arquivo de entrada, sem limite e substituições.")
     else:
         arguments = parseOptions(sys.argv)
     if (arguments != None):
-        if (arguments[0] == ""):
+        if (arguments[0] == "") and (arguments[1] == ["-"]):
+            arguments[0] = "-"
+        elif (arguments[0] == ""):
             print("Assumindo 'sents.txt' como arquivo de saída")
             arguments[0] = 'sents.txt'
         if (arguments[1] == []):
             print("Nenhum arquivo de entrada válido - por favor corrija e tente novamente")
         else:
-            outfile = open(arguments[0], "w")
-            inputText = ""
-            for oneInput in arguments[1]:
-                infile = open(oneInput, "r")
-                inputText += infile.read()
-                infile.close()
-            s = stripSents(inputText, outfile, arguments[2], arguments[3])
-            outfile.close()
-            print("Sentenciamento terminado com {} sentenças extraídas e salvas em {}".format(s, arguments[0]))
+            # the standard output carries the sentences, the messages go to the standard error
+            if (arguments[0] == "-"):
+                outfile, messages = sys.stdout, sys.stderr
+            else:
+                outfile, messages = open(arguments[0], "w"), sys.stdout
+            # each input file is a document apart, sentenced by parallel processes
+            if (arguments[4] > 1) or (arguments[5]):
+                s = stripDocs(arguments[1], outfile, arguments[2], arguments[3], arguments[4], arguments[5])
+            else:
+                infiles = []
+                for oneInput in arguments[1]:
+                    if (oneInput == "-"):
+                        infiles.append(sys.stdin)
+                    else:
+                        infiles.append(open(oneInput, "r"))
+                # the input files are read as a single text, sentences read from the standard input are written at once
+                s = stripStream(infiles, outfile, arguments[2], arguments[3], flush=("-" in arguments[1]))
+                for infile in infiles:
+                    if (infile != sys.stdin):
+                        infile.close()
+            if (outfile != sys.stdout):
+                outfile.close()
+            print("Sentenciamento terminado com {} sentenças extraídas e salvas em {}".format(s, arguments[0]), file=messages)
     else:
         print("Problemas com parâmetros - por favor corrija e tente novamente")
 
-portSent()
+if __name__ == "__main__":
+    portSent()
 
 
@@ -0,0 +1,80 @@
+# portSentCheck - regressão do sentenciador portSent (saída idêntica a arquivos
+#    de referência)
+#
+# Os arquivos de referência (golden) são as sentenças geradas pela versão
+#    original do portSent (que lia o texto inteiro) a partir de um texto
+#    aleatório ('golden/nbsp.txt') com espaços não separáveis (U+00A0) junto de
+#    espaços repetidos, pontuações, abreviações, marcas de itens (" *", " >>",
+#    " | ") e quebras de linha, com substituição de caracteres (-r), sem limite
+#    e com limite de 200 caracteres por sentença. A verificação sentencia o
+#    texto com stripSents e também lido em pedaços pequenos (stripStream), que
+#    podem ser cortados em qualquer ponto do texto, e compara com as referências.
+#
+# Opções:
+#
+# -h help
+#
+# Exemplo de utilização:
+#
+# python3 portSentCheck.py
+
+import sys, os, io
+import portSent
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(BASE_DIR, "golden")
+# limit of characters per sentence of each case, and sizes of the pieces read by stripStream
+LIMITS = [0, 200]
+SIZES = [65536, 1, 2, 3, 7, 64]
+
+def goldenName(limit):
+    return os.path.join(GOLDEN_DIR, "nbsp_r_l{}.txt".format(limit))
+
+def readText():
+    infile = open(os.path.join(GOLDEN_DIR, "nbsp.txt"), "r", newline="")
+    text = infile.read()
+    infile.close()
+    return text
+
+def checkGolden():
+    text = readText()
+    ok = True
+    for limit in LIMITS:
+        infile = open(goldenName(limit), "r")
+        golden = infile.read()
+        infile.close()
+        for size in SIZES:
+            outfile = io.StringIO()
+            if (size == SIZES[0]):
+                portSent.stripSents(text, outfile, limit, True)
+            else:
+                portSent.stripStream([io.StringIO(text, newline="")], outfile, limit, True, size=size)
+            current = outfile.getvalue()
+            name = "nbsp -r -l {} (pedaços de {})".format(limit, size)
+            if (current == golden):
+                print("{:36} idêntico ({} sentenças)".format(name, golden.count("\n")))
+            else:
+                ok = False
+                goldenLines, currentLines = golden.split("\n"), current.split("\n")
+                for i in range(max(len(goldenLines), len(currentLines))):
+                    if (i >= len(goldenLines)) or (i >= len(currentLines)) or (goldenLines[i] != currentLines[i]):
+                        break
+                print("{:36} DIFERENTE a partir da linha {}:".format(name, i+1))
+                print("  referência:", repr(goldenLines[i]) if i < len(goldenLines) else "<fim>")
+                print("  atual:     ", repr(currentLines[i]) if i < len(currentLines) else "<fim>")
+    return ok
+
+#################################################
+### função principal do programa
+#################################################
+def portSentCheck():
+    if (len(sys.argv) > 1) and (sys.argv[1] in ["-h", "-help"]):
+        print("Opções:\n-h ajuda")
+        return 0
+    elif (len(sys.argv) > 1):
+        print("Opção {} inválida, por favor execute novamente".format(sys.argv[1]))
+        return 2
+    return 0 if checkGolden() else 1
+
+if __name__ == "__main__":
+    sys.exit(portSentCheck())
@@ -1,90 +1,332 @@
 
 # class UDlexPT - the PortiLexicon-UD it reads dic files from the current directory
 #               - it should contain WORDmaster.txt plus the 12 tags .tsv files
+#               - or the binary snapshot UDlexPT.bin compiled from them (see below)
 #
 # member functions:
-#    UDlexPT                    - the constructor
+#    UDlexPT(snapshot, lazy, budget, shared) - the constructor - it attaches the shared memory block named
+#                                 shared (if there is one, and valid), otherwise
+#                                 it maps the snapshot if it is up to date with the dic files, otherwise
+#                                 it reads the dic files (snapshot=None to always read them);
+#                                 with lazy=True each dic file is read only at the first access to its tag and,
+#                                 if budget > 0, the least recently used tag tables are dropped (to be read
+#                                 again when needed) to keep at most budget entries in memory
 #    sget(self, word):          # get the entries for a word - returns a list with 3-tuples (empty if absent)
 #    exists(self, word):        # returns True if the word exists
 #    pget(self, word, tag):     # get the entries of a word for a specific tag - return similar to sget
 #    pexists(self, word, tag):  # returns True if this word has at least one entry for tag
 #    theTags(self, word):       # returns an array of all tags of a word - empty if absent of the lexicon
+#    featMask(self, feats):     # returns the bitset of features given as a string ("Gender=Fem|Number=Sing")
+#                                 or a list of them ("Name=Value", each one interned to a bit at first sight)
+#    pbits(self, word, tag):    # get the features bitsets of the entries of a word for a specific tag
+#    agree(self, word, tags, require, forbid): # returns True if some entry of a word for one of the tags
+#                                 has all the required features and none of the forbidden ones
+#    bulk_lookup(self, words, tags, ranges): # returns a NumPy uint16 array with the bitmask of the tags
+#                                 (bit i for self.tags[i]) having entries of each word, restricted to the
+#                                 given tags (all if None); with ranges=True (snapshot only) it also returns
+#                                 the first and last+1 entry of each word, to be read by entryRange
+#    entryRange(self, start, end): # get the entries start to end-1 of the snapshot - return similar to sget
+#    share(self):               # copies the lexicon (as a snapshot) into a shared memory block and returns its
+#                                 name, for other processes to use it read-only with UDlexPT(shared=name)
+#    unshare(self):             # releases the shared memory block created by share
+#    stats(self, outfile):      # prints the number of words and entries of each tag (LaTeX table)
+#    usage(self):               # returns the accesses, readings and residency of the master index and each tag
+#    touched(self):             # returns the tags accessed so far
+#
+# function buildSnapshot(snapshot) - compiles the dic files into the binary snapshot
+#
+# Several worker processes share a single copy of the lexicon either mapping the same
+#    snapshot file (the pages are shared by the operating system) or attaching a
+#    shared memory block created once by a parent process:
+#
+#    lex = UDlexPT()
+#    name = lex.share()
+#    ... start the workers, each one creating its UDlexPT(shared=name) (the name is
+#        given to each worker, e.g. as the initargs of a multiprocessing.Pool) ...
+#    lex.unshare()
+#
+# The snapshot (version 1, native byte order) is memory mapped, so it is opened in
+#    milliseconds and its pages are shared by all processes using it:
+#    header   - "UDLX", version, byte order mark, counts and the signature (name, size
+#               and modification time) of the dic files it was compiled from
+#    strings  - string table, offsets (uint32) and UTF-8 bytes of every distinct
+#               word, lemma, features and list of tags
+#    words    - for each word its string, its WORDmaster tags (string, NONE if absent),
+#               its first entry (uint32) and the bitmask of the tags of its entries (uint16)
+#    entries  - for each entry its lemma, its features (strings) and its tag (uint8),
+#               grouped by word and tag in the order of the dic files
+#    index    - open addressing hash table (crc32 of the word, linear probing) of word numbers + 1
+#
+# Building the snapshot (again whenever the dic files change):
+#
+# python3 lexikon.py [-o UDlexPT.bin] [-stats]
 
+import sys, os, io, json, mmap, struct, zlib, atexit, threading
+from array import array
+from multiprocessing import shared_memory
 from os import path
 
+DIC_DIR = path.dirname(path.abspath(__file__))
+SNAPSHOT = path.join(DIC_DIR, "UDlexPT.bin")
+TAGS = ["ADJ", "ADP", "ADV", "AUX", "CCONJ", "DET", "INTJ", \
+    "NOUN", "NUM", "PRON", "SCONJ", "VERB"]
+
+MAGIC, VERSION, BOM, NONE = b"UDLX", 1, 0x01020304, 0xFFFFFFFF
+# magic, version, byte order mark, strings, string bytes, words, master words, entries, index slots, signature bytes
+HEADER = struct.Struct("=4sIIIIIIIII")
+
+def sourceSignature():   # name, size and modification time of the dic files
+    signature = []
+    for name in ["WORDmaster.txt"]+[t+".tsv" for t in TAGS]:
+        try:
+            st = os.stat(path.join(DIC_DIR, name))
+            signature.append([name, st.st_size, st.st_mtime_ns])
+        except OSError:
+            signature.append([name, None, None])
+    return signature
+
+# bit of each feature (Name=Value) and bitset of each features string, the same for all
+#    the UDlexPT of a process, so the bitsets of one can be tested against another;
+#    a new feature gets its bit holding FEATLOCK, so two threads never give the same
+#    bit to two features (the bitsets themselves are the same whoever computes them)
+FEATURES = {}
+FEATBITS = {"_": 0}
+FEATLOCK = threading.Lock()
+
+def align(n):
+    return (n+7) & ~7
+
+class UDlexSnapshot:
+    def __init__(self, filename=None, shared=None):  # maps a snapshot file or a shared memory block, ValueError if it is not a valid one
+        self.shm = None
+        if (shared != None):
+            self.shm = shared_memory.SharedMemory(name=shared)
+            self.mm = self.shm.buf
+            filename = shared
+        else:
+            infile = open(filename, "rb")
+            self.mm = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            infile.close()
+        magic, version, bom, nStrings, nBytes, nWords, self.nMaster, self.nEntries, nSlots, nSign = \
+            HEADER.unpack_from(self.mm, 0)
+        if (magic != MAGIC) or (version != VERSION) or (bom != BOM):
+            raise ValueError("{} is not a version {} UDlexPT snapshot".format(filename, VERSION))
+        self.signature = json.loads(bytes(self.mm[HEADER.size:HEADER.size+nSign]))
+        view, pos = memoryview(self.mm), align(HEADER.size+nSign)
+        sections = []
+        for fmt, n in [["I", nStrings+1], ["B", nBytes], ["I", nWords], ["I", nWords], ["I", nWords+1], \
+                       ["H", nWords], ["I", self.nEntries], ["I", self.nEntries], ["B", self.nEntries], ["I", nSlots]]:
+            size = n*struct.calcsize(fmt)
+            if (pos+size > len(self.mm)):
+                raise ValueError("{} is truncated".format(filename))
+            sections.append(view[pos:pos+size].cast(fmt))
+            pos = align(pos+size)
+        self.offsets, self.data, self.wordStr, self.wordMaster, self.wordFirst, \
+            self.wordTags, self.entLemma, self.entFeats, self.entTag, self.slots = sections
+        self.mask = nSlots-1
+        self.sections = sections
+    def close(self):  # releases the views of a shared memory block (it cannot be closed while they exist)
+        for section in self.sections:
+            section.release()
+        self.sections = []
+        if (self.shm != None):
+            self.mm = None
+            self.shm.close()
+    def string(self, s):
+        return str(self.data[self.offsets[s]:self.offsets[s+1]], "utf-8")
+    def find(self, word):  # returns the number of a word, -1 if absent
+        key = word.encode("utf-8", "surrogatepass")
+        h = zlib.crc32(key) & self.mask
+        while True:
+            w = self.slots[h]
+            if (w == 0):
+                return -1
+            s = self.wordStr[w-1]
+            if (self.data[self.offsets[s]:self.offsets[s+1]] == key):
+                return w-1
+            h = (h+1) & self.mask
+    def masterTags(self, word, default):  # the WORDmaster tags of a word
+        w = self.find(word)
+        if (w == -1) or (self.wordMaster[w] == NONE):
+            return default
+        return self.string(self.wordMaster[w]).split(" ")
+    def tagEntries(self, word, i, default):  # the [lemma, features] entries of a word for the i-th tag
+        w = self.find(word)
+        if (w == -1) or ((self.wordTags[w] >> i) & 1 == 0):
+            return default
+        return [[self.string(self.entLemma[e]), self.string(self.entFeats[e])] \
+                for e in range(self.wordFirst[w], self.wordFirst[w+1]) if self.entTag[e] == i]
+
+class snapshotView:   # read-only dict-like view of the master index (tag None) or of one tag table of a snapshot
+    def __init__(self, snapshot, tag=None):
+        self.snapshot = snapshot
+        self.tag = tag
+    def get(self, word, default=None):
+        if (self.tag == None):
+            return self.snapshot.masterTags(word, default)
+        return self.snapshot.tagEntries(word, self.tag, default)
+
 class UDlexPT:
-    def __init__(self):  # creates the lexicon
-        self.tags = ["ADJ", "ADP", "ADV", "AUX", "CCONJ", "DET", "INTJ", \
-            "NOUN", "NUM", "PRON", "SCONJ", "VERB"]
-        self.master = {}
+    def __init__(self, snapshot=SNAPSHOT, lazy=False, budget=0, shared=None):  # creates the lexicon
+        self.tags = list(TAGS)
+        self.snapshot = None
+        self.shm = None
+        self.lazy, self.budget = lazy, budget
+        # accesses, readings, entries and last access (clock) of the master index (-1) and of each tag table
+        self.accesses = [0]*(len(self.tags)+1)
+        self.loads = [0]*(len(self.tags)+1)
+        self.sizes = [0]*(len(self.tags)+1)
+        self.lastUse = [0]*len(self.tags)
+        self.clock = 0
+        self.features = FEATURES
+        self.featBits = FEATBITS
+        if (shared != None):
+            try:
+                self.snapshot = UDlexSnapshot(shared=shared)
+                atexit.register(self.snapshot.close)
+            except (OSError, ValueError) as e:
+                print("UDlexPT shared memory block ignored:", e, file=sys.stderr)
+        if (self.snapshot == None) and (snapshot != None) and (path.isfile(snapshot)):
+            try:
+                self.snapshot = UDlexSnapshot(snapshot)
+            except (OSError, ValueError) as e:
+                print("UDlexPT snapshot ignored:", e, file=sys.stderr)
+            # a snapshot out of date with the dic files is ignored (unless the dic files are absent)
+            if (self.snapshot != None) and (self.snapshot.signature != sourceSignature()) and \
+               (path.isfile(path.join(DIC_DIR, "WORDmaster.txt"))):
+                print("UDlexPT snapshot", snapshot, "is out of date, reading the dic files", \
+                      "(rebuild it with 'python3 lexikon.py')", file=sys.stderr)
+                self.snapshot = None
+        if (self.snapshot != None):
+            self.master = snapshotView(self.snapshot)
+            self.t = [snapshotView(self.snapshot, i) for i in range(len(self.tags))]
+            self.words = self.snapshot.nMaster
+            self.entries = self.snapshot.nEntries
+            return
+        self.master = None
         self.words = 0
         self.entries = 0
-        nEnt = [0]*len(self.tags)
-        nNAE = [0]*len(self.tags)
-        nEnD = [0]*len(self.tags)
+        self.t = [None]*len(self.tags)
+        if (not lazy):
+            self.readMaster()
+            for i in range(len(self.tags)):
+                self.readTag(i)
+    def readMaster(self):   # reads WORDmaster.txt
+        self.master = {}
+        self.words = 0
         infile = open(path.dirname(__file__)+"/WORDmaster.txt")
         for line in infile:
             buf = line[:-1].split(",")
             tg = buf[1].split(" ")
             self.master.update({buf[0]:tg})
             self.words += 1
-            ### compute totals
+        infile.close()
+        self.loads[-1] += 1
+        self.sizes[-1] = self.words
+        return self.master
+    def readTag(self, i):   # reads the .tsv file of the i-th tag, dropping the least recently used tables over the budget
+        table = {}
+        n = 0
+        infile = open(path.dirname(__file__)+"/"+self.tags[i]+".tsv")
+        for line in infile:
+            buf = line[:-1].split("\t")
+            # lemmas (most of them equal to the word) and features strings are shared by all entries
+            word = sys.intern(buf[0])
+            lemma = word if (buf[1] == word) else sys.intern(buf[1])
+            feats = sys.intern(buf[2])
+            if (feats not in self.featBits):
+                self.featMask(feats)
+            entry = table.get(word,"none")
+            if (entry == "none"):
+                table.update({word:[(lemma,feats)]})
+            else:
+                entry.append((lemma,feats))
+            n += 1
+        infile.close()
+        self.loads[i] += 1
+        self.sizes[i] = n
+        self.entries = sum(self.sizes[:-1])
+        if (self.budget > 0):
+            resident = [j for j in range(len(self.tags)) if self.t[j] != None]
+            while (resident != []) and (sum(self.sizes[j] for j in resident)+n > self.budget):
+                j = min(resident, key=lambda j: self.lastUse[j])
+                self.t[j] = None
+                resident.remove(j)
+        self.t[i] = table
+        return table
+    def table(self, i):   # the table of the i-th tag - read at its first access in lazy mode
+        self.accesses[i] += 1
+        self.clock += 1
+        self.lastUse[i] = self.clock
+        t = self.t[i]
+        if (t == None):
+            t = self.readTag(i)
+        return t
+    def masterIndex(self):   # the master index - read at its first access in lazy mode
+        self.accesses[-1] += 1
+        if (self.master == None):
+            return self.readMaster()
+        return self.master
+    def usage(self):   # accesses, readings and residency of the master index and of each tag table
+        ans = {}
+        for i, name in enumerate(self.tags+["WORDmaster"]):
+            resident = (self.snapshot != None) or ((self.master if i == len(self.tags) else self.t[i]) != None)
+            ans[name] = {"accesses": self.accesses[i], "loads": self.loads[i], "resident": resident, "entries": self.sizes[i]}
+        return ans
+    def touched(self):   # tags accessed so far
+        return [self.tags[i] for i in range(len(self.tags)) if self.accesses[i] > 0]
+    def stats(self, outfile=sys.stderr):  # prints the number of words and entries of each tag
+        nEnt = [0]*len(self.tags)
+        nNAE = [0]*len(self.tags)
+        nEnD = [0]*len(self.tags)
+        if (self.snapshot != None):
+            snap = self.snapshot
+            allTags = [snap.string(m).split(" ") for m in snap.wordMaster if m != NONE]
+            for i in snap.entTag:
+                nEnD[i] += 1
+        else:
+            allTags = self.masterIndex().values()
+            for i in range(len(self.tags)):
+                nEnD[i] = sum(len(entry) for entry in self.table(i).values())
+        for tg in allTags:
             if (len(tg) == 1):
                 nNAE[self.tags.index(tg[0])] += 1
             for t in tg:
                 nEnt[self.tags.index(t)] += 1
-        infile.close()
-        self.t = []
-        i = 0
-        for t in self.tags:
-            self.t.append({})
-            infile = open(path.dirname(__file__)+"/"+t+".tsv")
-            for line in infile:
-                buf = line[:-1].split("\t")
-                entry = self.t[i].get(buf[0],"none")
-                if (entry == "none"):
-                    self.t[i].update({buf[0]:[[buf[1],buf[2]]]})
-                else:
-                    entry.append([buf[1],buf[2]])
-                    self.t[i].update({buf[0]:entry})
-                self.entries += 1
-                nEnD[self.tags.index(t)] += 1
-            infile.close()
-            i += 1
-        print("UDlexPT read with", self.words, "distinct words and", self.entries, "entries")
-        print("{:5} & {:6} & {:6} & {:6} \\\\ \\hline".format("tag","total","amb","non-amb"))
+        print("UDlexPT read with", self.words, "distinct words and", sum(nEnD), "entries", file=outfile)
+        print("{:5} & {:6} & {:6} & {:6} \\\\ \\hline".format("tag","total","amb","non-amb"), file=outfile)
         accW, accN, accE = 0, 0, 0
         for t in self.tags:
             print("{:5} & {:6} & {:6} & {:6} & {:6} \\\\ \\hline".format(t, \
                 nEnt[self.tags.index(t)], \
                 nEnt[self.tags.index(t)]-nNAE[self.tags.index(t)], \
                 nNAE[self.tags.index(t)], \
-                nEnD[self.tags.index(t)]))
+                nEnD[self.tags.index(t)]), file=outfile)
             accW += nEnt[self.tags.index(t)]
             accN += nNAE[self.tags.index(t)]
             accE += nEnD[self.tags.index(t)]
-        print("{:5} & {:6} & {:6} & {:6} & {:6} \\\\ \\hline".format("total", self.words, self.words-accN, accN, accE))
+        print("{:5} & {:6} & {:6} & {:6} & {:6} \\\\ \\hline".format("total", self.words, self.words-accN, accN, accE), file=outfile)
     def sget(self, word):   # get the entries for a word
-        tags = self.master.get(word,"none")
+        tags = self.masterIndex().get(word,"none")
         if (tags == "none"):
             return []
         else:
             ans = []
             for t in tags:
-                a = self.t[self.tags.index(t)].get(word)
+                a = self.table(self.tags.index(t)).get(word)
                 #if (a == None):
                 #    input("fix WORDmaster for: "+word)
                 for n in a:
                     ans.append([n[0],t,n[1]])
             return ans
     def exists(self, word):   # returns True if the word exists
-        tags = self.master.get(word,"none")
+        tags = self.masterIndex().get(word,"none")
         if (tags == "none"):
             return False
         else:
             return True
     def pget(self, word, tag):   # get the entries of a word for a specific tag
-        a = self.t[self.tags.index(tag)].get(word,"none")
+        a = self.table(self.tags.index(tag)).get(word,"none")
         if (a == "none"):
             return []
         else:
@@ -93,15 +335,188 @@ class UDlexPT:
                 ans.append([n[0],tag,n[1]])
             return ans
     def pexists(self, word, tag):    # returns True if this word has at least one entry for tag
-        a = self.t[self.tags.index(tag)].get(word,"none")
+        a = self.table(self.tags.index(tag)).get(word,"none")
         if (a == "none"):
             return False
         else:
             return True
     def theTags(self, word):   # returns an array of all tags of a word - empty if absent of the dictionary
-        ts = self.master.get(word,"none")
+        ts = self.masterIndex().get(word,"none")
         if (ts == "none"):
             return []
         else:
             return ts
+    def featMask(self, feats):   # bitset of a features string or of a list of features
+        if (isinstance(feats, int)):
+            return feats
+        if (isinstance(feats, str)):
+            bits = self.featBits.get(feats)
+            if (bits != None):
+                return bits
+            parts = feats.split("|")
+        else:
+            parts = feats
+        bits = 0
+        for f in parts:
+            if (f != "_") and (f != ""):
+                b = self.features.get(f)
+                if (b == None):
+                    with FEATLOCK:
+                        b = self.features.get(f)
+                        if (b == None):
+                            b = self.features[f] = len(self.features)
+                bits |= 1 << b
+        if (isinstance(feats, str)):
+            self.featBits[feats] = bits
+        return bits
+    def pbits(self, word, tag):   # get the features bitsets of the entries of a word for a specific tag
+        a = self.table(self.tags.index(tag)).get(word,"none")
+        if (a == "none"):
+            return []
+        else:
+            ans = []
+            for n in a:
+                bits = self.featBits.get(n[1])
+                if (bits == None):
+                    bits = self.featMask(n[1])
+                ans.append(bits)
+            return ans
+    def bulk_lookup(self, words, tags=None, ranges=False):   # tag bitmasks (and entry ranges) of a batch of words
+        import numpy as np   # only needed by this function
+        if (tags == None):
+            tags = self.tags
+        indexes = [self.tags.index(t) for t in tags]
+        if (self.snapshot != None):
+            snap = self.snapshot
+            for i in indexes:
+                self.table(i)
+            found = np.fromiter((snap.find(w) for w in words), dtype=np.int64, count=len(words))
+            absent = (found == -1)
+            found[absent] = 0
+            tagMask = sum(1 << i for i in indexes)
+            masks = np.frombuffer(snap.wordTags, dtype=np.uint16)[found] & np.uint16(tagMask)
+            masks[absent] = 0
+            if (ranges):
+                first = np.frombuffer(snap.wordFirst, dtype=np.uint32)
+                starts, ends = first[found], first[found+1]
+                starts[absent] = 0
+                ends[absent] = 0
+                return masks, starts, ends
+            return masks
+        if (ranges):
+            raise ValueError("entry ranges are only available with the UDlexPT snapshot")
+        masks = np.zeros(len(words), dtype=np.uint16)
+        for i in indexes:
+            table = self.table(i)
+            masks |= np.fromiter((w in table for w in words), dtype=bool, count=len(words)).astype(np.uint16) << i
+        return masks
+    def entryRange(self, start, end):   # get the entries start to end-1 of the snapshot
+        snap = self.snapshot
+        return [[snap.string(snap.entLemma[e]), self.tags[snap.entTag[e]], snap.string(snap.entFeats[e])] \
+                for e in range(start, end)]
+    def share(self):   # copies the lexicon into a shared memory block, returns its name
+        if (self.snapshot != None):
+            data = bytes(self.snapshot.mm[:len(self.snapshot.mm)])
+        else:
+            buffer = io.BytesIO()
+            writeSnapshot(self, buffer, sourceSignature())
+            data = buffer.getvalue()
+        self.unshare()
+        self.shm = shared_memory.SharedMemory(create=True, size=len(data))
+        self.shm.buf[:len(data)] = data
+        return self.shm.name
+    def unshare(self):   # releases the shared memory block created by share
+        if (self.shm != None):
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+    def agree(self, word, tags, require=0, forbid=0):   # True if some entry has the required features and not the forbidden ones
+        if (isinstance(tags, str)):
+            tags = [tags]
+        require, forbid = self.featMask(require), self.featMask(forbid)
+        for t in tags:
+            for bits in self.pbits(word, t):
+                if (bits & require == require) and (bits & forbid == 0):
+                    return True
+        return False
+
+#################################################
+### compiles the dic files into the binary snapshot
+#################################################
+def writeSnapshot(lex, outfile, signature):
+    strings, ids = [], {}
+    def intern(s):
+        i = ids.get(s)
+        if (i == None):
+            i = ids[s] = len(strings)
+            strings.append(s.encode("utf-8", "surrogatepass"))
+        return i
+    master = lex.masterIndex()
+    tables = [lex.table(i) for i in range(len(lex.tags))]
+    words = set(master)
+    for t in tables:
+        words.update(t)
+    words = sorted(words)
+    wordStr, wordMaster, wordFirst, wordTags = array("I"), array("I"), array("I"), array("H")
+    entLemma, entFeats, entTag = array("I"), array("I"), array("B")
+    for word in words:
+        wordStr.append(intern(word))
+        tags = master.get(word)
+        wordMaster.append(NONE if tags == None else intern(" ".join(tags)))
+        wordFirst.append(len(entTag))
+        mask = 0
+        for i in range(len(lex.tags)):
+            for lemma, feats in tables[i].get(word, []):
+                entLemma.append(intern(lemma))
+                entFeats.append(intern(feats))
+                entTag.append(i)
+                mask |= 1 << i
+        wordTags.append(mask)
+    wordFirst.append(len(entTag))
+    nSlots = 1
+    while (nSlots < 2*len(words)):
+        nSlots *= 2
+    slots = array("I", [0])*nSlots
+    for w in range(len(words)):
+        h = zlib.crc32(strings[wordStr[w]]) & (nSlots-1)
+        while (slots[h] != 0):
+            h = (h+1) & (nSlots-1)
+        slots[h] = w+1
+    offsets = array("I", [0])
+    for s in strings:
+        offsets.append(offsets[-1]+len(s))
+    sign = json.dumps(signature).encode("utf-8")
+    def write(data):
+        outfile.write(data)
+        outfile.write(b"\0"*(align(outfile.tell())-outfile.tell()))
+    write(HEADER.pack(MAGIC, VERSION, BOM, len(strings), offsets[-1], len(words), lex.words, lex.entries, nSlots, len(sign))+sign)
+    for section in [offsets, b"".join(strings), wordStr, wordMaster, wordFirst, wordTags, entLemma, entFeats, entTag, slots]:
+        write(section)
+
+def buildSnapshot(snapshot=SNAPSHOT):
+    signature = sourceSignature()
+    lex = UDlexPT(snapshot=None)
+    # write a temporary file and replace the snapshot at once, processes mapping the old one keep it
+    outfile = open(snapshot+".tmp", "wb")
+    writeSnapshot(lex, outfile, signature)
+    outfile.close()
+    os.replace(snapshot+".tmp", snapshot)
+    return lex
 
+if __name__ == "__main__":
+    snapshot, stats = SNAPSHOT, False
+    i = 1
+    while i < len(sys.argv):
+        if (sys.argv[i] in ["-o", "-output"]) and (i+1 < len(sys.argv)):
+            snapshot = sys.argv[i+1]
+            i += 2
+        elif (sys.argv[i] in ["-stats"]):
+            stats = True
+            i += 1
+        else:
+            print("Uso: python3 lexikon.py [-o UDlexPT.bin] [-stats]")
+            sys.exit(2)
+    lex = buildSnapshot(snapshot)
+    print("UDlexPT snapshot", snapshot, "built with", lex.words, "distinct words and", lex.entries, "entries")
+    if (stats):
+        lex.stats(sys.stdout)
@@ -0,0 +1,89 @@
+# portText - normalização de texto e índice de abreviações compartilhados
+#    por portSent e portTok
+#
+# A classe Normalizer recebe uma lista de substituições, aplicadas em sequência
+#    como chamadas de str.replace (cada uma é uma busca em C, muito mais rápida
+#    que percorrer o texto caractere a caractere em Python, com str.translate
+#    ou com uma expressão regular), seguidas, se collapse=True, da troca de
+#    espaços repetidos por um só espaço, feita por uma única expressão regular.
+#
+# O atributo chars contém os caracteres que as substituições podem alterar:
+#    um texto cortado entre dois outros caracteres pode ser normalizado em
+#    pedaços, com o mesmo resultado do texto inteiro (nenhuma substituição
+#    alcança esses caracteres, que separam os trechos alterados).
+#
+# A classe AbbrevIndex indexa as abreviações de um arquivo (uma por linha) em
+#    um conjunto, para as abreviações exatas, e em uma trie dos sufixos
+#    invertidos, para os pedaços terminados por uma abreviação precedida de
+#    um caractere que não é letra (como "(dr." ou "-sr."), de modo que cada
+#    consulta custa no máximo o tamanho da maior abreviação. A função
+#    abbrevIndex lê cada arquivo uma única vez por processo.
+#
+# Exemplo de utilização:
+#
+# norm = Normalizer([["  ", " "], ["—", "-"], [" .", "."], ["\n", " "]], collapse=True)
+# text = norm("Um  texto — com quebras\nde linha .")
+# abbrev = abbrevIndex("abbrev.txt")
+# abbrev.isAbbrev("(dr.")
+
+import os, re
+import functools
+
+SPACES = re.compile("  +")
+
+class Normalizer:
+    def __init__(self, replaceables, collapse=False):
+        # substitutions that change nothing are dropped
+        self.replaceables = [[r[0], r[1]] for r in replaceables if r[0] != r[1]]
+        self.collapse = collapse
+        self.chars = set("".join(r[0] for r in self.replaceables))
+        if (collapse):
+            self.chars.add(" ")
+
+    def __call__(self, s):
+        for old, new in self.replaceables:
+            s = s.replace(old, new)
+        if (self.collapse):
+            s = SPACES.sub(" ", s)
+        return s
+
+class AbbrevIndex:
+    def __init__(self, abbrevFile):
+        # the abbreviations, for exact matches, and their reversed suffix trie,
+        #    for abbreviations at the end of a chunk
+        self.abbrevs = set()
+        self.abbrevTrie = {}
+        infile = open(abbrevFile, "r")
+        for line in infile:
+            a = line[:-1]
+            if (a != ""):
+                self.abbrevs.add(a)
+                node = self.abbrevTrie
+                for c in reversed(a):
+                    node = node.setdefault(c, {})
+                node[""] = True
+        infile.close()
+
+    # is the chunk an abbreviation, or does it end with an abbreviation preceded by a non letter
+    def isAbbrev(self, chunk):
+        return (chunk in self.abbrevs) or self.isAbbrevAt(chunk, 0, len(chunk))
+
+    # same of isAbbrev for the chunk b[start:end], without slicing it - the
+    #    reversed suffix trie is walked at most for the longest abbreviation
+    def isAbbrevAt(self, b, start, end):
+        node, j = self.abbrevTrie, end
+        while (j > start):
+            node = node.get(b[j-1])
+            if (node == None):
+                return False
+            j -= 1
+            if ("" in node) and ((j == start) or (not b[j-1].isalpha())):
+                return True
+        return False
+
+@functools.lru_cache(maxsize=None)
+def readAbbrevIndex(abbrevFile):
+    return AbbrevIndex(abbrevFile)
+
+def abbrevIndex(abbrevFile):   # the index of an abbreviations file, read once per process
+    return readAbbrevIndex(os.path.realpath(abbrevFile))
@@ -8,15 +8,17 @@
 #    em conjunto com este arquivo ("portTok.py") e com os arquivos textuais
 #    do léxico ("ADJ.tsv", "ADP.tsv", "ADV.tsv", "AUX.tsv", "CCONJ.tsv", 
 #    "DET.tsv", "INTJ.tsv", "NOUN.tsv", "NUM.tsv", "PRON.tsv", "SCONJ.tsv", 
-#    "VERB.tsv", "WORDmaster.txt").
+#    "VERB.tsv", "WORDmaster.txt"), ou com o seu snapshot binário "UDlexPT.bin",
+#    gerado por "python3 lexikon.py" e carregado em milissegundos.
 #
 # Opções:
 #
 # -h help
-# -o output file
+# -o output file ('-' for the standard output)
 # -m matches the paired punctuations
 # -t trims headlines (heuristic)
 # -s sentence id (sid) model
+# -j number of parallel processes (jobs)
 #
 # Exemplo de utilização:
 #
@@ -28,12 +30,27 @@
 #   usa S0000 como modelo de identificador de sentença e
 #   salva as sentenças devidamente tokenizadas no arquivo 'sents.conllu'
 #
+# Exemplo de utilização em pipeline (entrada '-' lida da entrada padrão,
+#   cada sentença é escrita na saída padrão assim que é tokenizada):
+#
+# cat sents.txt | portTok -m -t -
+#
+# Exemplo de utilização como biblioteca:
+#
+# tok = PortTokenizer()
+# tokens = tok.tokenize("Maria gosta de comer banana.")
+# tok.write(tokens, "Maria gosta de comer banana.", "S0001", sys.stdout)
+#
 # last edit: 04/27/2024
 # created by Lucelene Lopes - lucelene@gmail.com
 
-import sys, os
+import sys, os, io, re
+import functools
+import multiprocessing
 import lexikon
-lex = lexikon.UDlexPT()
+import portText
+# only the tags used by desambIt are read from the dic files (when there is no snapshot)
+lex = lexikon.UDlexPT(lazy=True)
 
 
 #################################################
@@ -41,16 +58,22 @@ lex = lexikon.UDlexPT()
 #################################################
 def parseOptions(arguments):
     # default options
-    output_file, input_file, match, trim, model = "", [], False, False, "S0000"
+    output_file, input_file, match, trim, model, jobs = "", [], False, False, "S0000", 1
     i = 1
     while i < len(arguments):
-        if (arguments[i][0] == "-"):
+        # entrada padrão (stdin) como arquivo de entrada
+        if (arguments[i] == "-"):
+            input_file = "-"
+            i += 1
+        elif (arguments[i][0] == "-"):
             # ajuda (help) - mostra ajuda, nada é executado
             if ((arguments[i][1] == "h") and (len(arguments[i])==2)) or \
                (arguments[i] == "-help"):
                 print("Opções:\n-h ajuda\n-o arquivo de saída", \
                       "-m corrige pontuações casadas (aspas, parenteses, etc)", \
                       "-t remove possíveis MANCHETES que precedem as frases", \
+                      "-j número de processos paralelos", \
+                      "- como arquivo de entrada lê da entrada padrão, -o - escreve na saída padrão", \
                       "Exemplo de utilização:", \
                       "portTok -o sents.conllu -m -t -s S0000 sents.txt", \
                       "Busca as sentenças no arquivo 'sents.txt',", \
@@ -79,6 +102,15 @@ def parseOptions(arguments):
                 except:
                     print("modelo de identificador de sentença não informado - assumindo S000")
                     i += 1
+            # opção de número de processos paralelos (jobs)
+            elif ((arguments[i][1] == "j") and (len(arguments[i])==2)) or \
+                 (arguments[i] == "-jobs"):
+                try:
+                    jobs = int(arguments[i+1])
+                    i += 2
+                except:
+                    print("número de processos paralelos inválido - assumindo 1")
+                    i += 2
             # opção de arquivo de saída (um nome de arquivo)
             elif ((arguments[i][1] == "o") and (len(arguments[i])==2)) or \
                  (arguments[i] == "-output"):
@@ -96,7 +128,7 @@ def parseOptions(arguments):
             else:
                 print("O arquivo {} não foi encontrado, por favor execute novamente".format(arguments[i]))
                 return None
-    return [output_file, input_file, match, trim, model]
+    return [output_file, input_file, match, trim, model, jobs]
 
 #############################################################################
 #  Increment a name index
@@ -140,12 +172,15 @@ def nextName(name):
             return name+ans
     return "overflow"+ans
 
+# blanks reduction shared by trimIt and punctIt, as in portSent (see portText.py)
+SQUEEZE = portText.Normalizer([["  ", " "], ["  ", " "]])
+
 #############################################################################
 #  Trim the unwanted bits at the sentence - trimIt (step 1)
 #############################################################################
 def trimIt(s):
     # generate the bits separated by blanks trimming blanks before, after, and multiples
-    bits = s.strip().replace("  ", " ").replace("  ", " ").split(" ")
+    bits = SQUEEZE(s.strip()).split(" ")
     start = 0
     # remove itemize symbols
     if (bits[0] in ["*", "★", "-", "—", "–", ">", "."]):
@@ -229,45 +264,103 @@ def punctIt(s):
             S = S[:-2]+S[-1]+S[-2]
         else:
             S = S+"."
-    return S.replace("  ", " ").replace("  ", " ")
+    return SQUEEZE(S)
+
+#############################################################################
+#  Strip the non letters around a word and lower it - stripWord (within step 3)
+#############################################################################
+def stripWord(w):
+    start, end = 0, len(w)
+    for j in range(len(w)):
+        if (not w[j].isalpha()):
+            start = j+1
+        else:
+            break
+    for j in range(start,len(w)):
+        if (not w[j].isalpha()):
+            end = j
+            break
+    return w[start:end].lower()
+
+#############################################################################
+#  Context profile of a neighbour word, computed once per word and kept in
+#     a LRU cache - profileIt (within step 3)
+#
+#  returns the stripped word, a bitmask of its tags (bit i for lex.tags[i])
+#     and a bitmask of the agreement conditions met by at least one of its
+#     entries of each tag (bits 4*i to 4*i+3 for lex.tags[i]), only for the
+#     tags tested by desambIt (PROFILE_TAGS)
+#############################################################################
+MASC_PLUR, FEM_SING, MASC_SING, ART_MASC_PLUR = 1, 2, 4, 8   # agreement conditions
+
+def tagMask(*tags):
+    mask = 0
+    for t in tags:
+        mask |= 1 << lex.tags.index(t)
+    return mask
+
+def agreeMask(condition, *tags):
+    mask = 0
+    for t in tags:
+        mask |= condition << 4*lex.tags.index(t)
+    return mask
+
+VERB_AUX = tagMask("VERB", "AUX")
+PRON_ADV = tagMask("PRON", "ADV")
+NOUN_ADJ_DET = tagMask("NOUN", "ADJ", "DET")
+NOUN_ADJ_NUM_DET = tagMask("NOUN", "ADJ", "NUM", "DET")
+# some NOUN, ADJ or DET entry agrees with "os", "a", "o" or is an article agreeing with "os"
+NOUN_ADJ_DET_OS = agreeMask(MASC_PLUR, "NOUN", "ADJ", "DET")
+NOUN_ADJ_DET_A = agreeMask(FEM_SING, "NOUN", "ADJ", "DET")
+NOUN_ADJ_DET_O = agreeMask(MASC_SING, "NOUN", "ADJ", "DET")
+NOUN_ADJ_DET_ART_OS = agreeMask(ART_MASC_PLUR, "NOUN", "ADJ", "DET")
+# some DET entry agrees with "o" or is an article agreeing with "os"
+DET_O = agreeMask(MASC_SING, "DET")
+DET_ART_OS = agreeMask(ART_MASC_PLUR, "DET")
+
+PROFILE_TAGS = [lex.tags.index(t) for t in ["ADJ", "ADV", "AUX", "DET", "NOUN", "NUM", "PRON", "VERB"]]
+# features bitsets of the agreement conditions
+SING_FEM = lex.featMask("Number=Sing|Gender=Fem")
+PLUR_MASC = lex.featMask("Number=Plur|Gender=Masc")
+PLUR_FEM = lex.featMask("Number=Plur|Gender=Fem")
+ART = lex.featMask("PronType=Art")
+
+@functools.lru_cache(maxsize=65536)
+def profileIt(bit):
+    word = stripWord(bit)
+    tags, agree = 0, 0
+    for i in PROFILE_TAGS:
+        entries = lex.pbits(word, lex.tags[i])
+        if (entries != []):
+            tags |= 1 << i
+        for feats in entries:
+            if (feats & SING_FEM == 0):
+                agree |= MASC_PLUR << 4*i
+                if (feats & ART != 0):
+                    agree |= ART_MASC_PLUR << 4*i
+            if (feats & PLUR_MASC == 0):
+                agree |= FEM_SING << 4*i
+            if (feats & PLUR_FEM == 0):
+                agree |= MASC_SING << 4*i
+    return word, tags, agree
 
 #############################################################################
 #  Decide if ambiguous tokens are contracted or not - desambIt (within step 3)
 #############################################################################
 def desambIt(token, bits, i, lastField, s, SID, tokens):
-    def stripWord(w):
-        start, end = 0, len(w)
-        for j in range(len(w)):
-            if (not w[j].isalpha()):
-                start = j+1
-            else:
-                break
-        for j in range(start,len(w)):
-            if (not w[j].isalpha()):
-                end = j
-                break
-        return w[start:end].lower()
+    if (i > 0):
+        preWord, preTags, preAgree = profileIt(bits[i-1])
+    else:
+        preWord, preTags, preAgree = "", 0, 0
+    if (i < len(bits)-1):
+        posWord, posTags, posAgree = profileIt(bits[i+1])
+    else:
+        posWord, posTags, posAgree = "", 0, 0
     # nos - em os - nos
     if (token.lower() == "nos"):
-        if (i > 0):
-            preVERB = lex.pexists(stripWord(bits[i-1]), "VERB") or lex.pexists(stripWord(bits[i-1]), "AUX")
-        else:
-            preVERB = False
-        if (i < len(bits)-1):
-            posVERB = lex.pexists(stripWord(bits[i+1]), "VERB") or lex.pexists(stripWord(bits[i+1]), "AUX")
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "DET")
-            if (posNOUNDET):
-                possible = lex.pget(stripWord(bits[i+1]), "NOUN")+lex.pget(stripWord(bits[i+1]), "ADJ")+lex.pget(stripWord(bits[i+1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Sing" not in feats[2]) and ("Gender=Fem" not in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    posNOUNDET = False
-        else:
-            posVERB = False
-            posNOUNDET = False
+        preVERB = (preTags & VERB_AUX != 0)
+        posVERB = (posTags & VERB_AUX != 0)
+        posNOUNDET = (posAgree & NOUN_ADJ_DET_OS != 0)
         if (posVERB and not posNOUNDET):
             tokens.append([token, lastField])  # don't break
         else:
@@ -283,14 +376,8 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
                 tokens.append(["os","_"])
     # consigo - com si - consigo
     elif (token.lower() == "consigo"):
-        if (i > 0):
-            prePRONADV = lex.pexists(stripWord(bits[i-1]), "PRON") or lex.pexists(stripWord(bits[i-1]), "ADV")
-        else:
-            prePRONADV = False
-        if (i < len(bits)-1):
-            posVERB = lex.pexists(stripWord(bits[i+1]), "VERB") or lex.pexists(stripWord(bits[i+1]), "AUX")
-        else:
-            posVERB = False
+        prePRONADV = (preTags & PRON_ADV != 0)
+        posVERB = (posTags & VERB_AUX != 0)
         if (i < len(bits)-2):
             doQue = ((bits[i+1] == "do") and (bits[i+2] == "que")) or ((bits[i+1] == "sua"))
         else:
@@ -310,19 +397,7 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
                 tokens.append(["si","_"])
     # pra - para a - para
     elif (token.lower() == "pra"):
-        if (i < len(bits)-1):
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "DET")
-            if (posNOUNDET):
-                possible = lex.pget(stripWord(bits[i+1]), "NOUN")+lex.pget(stripWord(bits[i+1]), "ADJ")+lex.pget(stripWord(bits[i+1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Plur" not in feats[2]) and ("Gender=Masc" not in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    posNOUNDET = False
-        else:
-            posNOUNDET = False
+        posNOUNDET = (posAgree & NOUN_ADJ_DET_A != 0)
         if (posNOUNDET):
             tokens.append([token, "c"+lastField])  # break
             if (token.isupper()):
@@ -339,7 +414,7 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
     # pela - por a - pela
     elif (token.lower() == "pela"):
         if (i < len(bits)-1):
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "NUM") or lex.pexists(stripWord(bits[i+1]), "DET")
+            posNOUNDET = (posTags & NOUN_ADJ_NUM_DET != 0)
             properNOUNDIGIT = bits[i+1][0].isupper() or bits[i+1][0].isnumeric()
         else:
             posNOUNDET = False
@@ -360,7 +435,7 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
     # pelas - por as - pelas
     elif (token.lower() == "pelas"):
         if (i < len(bits)-1):
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "NUM") or lex.pexists(stripWord(bits[i+1]), "DET")
+            posNOUNDET = (posTags & NOUN_ADJ_NUM_DET != 0)
             properNOUNDIGIT = bits[i+1][0].isupper() or bits[i+1][0].isnumeric()
         else:
             posNOUNDET = False
@@ -380,35 +455,12 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
             tokens.append([token, lastField])  # don't break
     # pelo - por o - pelo
     elif (token.lower() == "pelo"):
-        if (i > 0):
-            preART = lex.pexists(stripWord(bits[i-1]), "DET")
-            if (preART):
-                possible = lex.pget(stripWord(bits[i-1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Plur" not in feats[2]) and ("Gender=Fem" not in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    preART = False
-                else:
-                    preART = (stripWord(bits[i-1]) != "que") and (stripWord(bits[i-1]) != "dado") and (stripWord(bits[i-1]) != "tanto") and (stripWord(bits[i-1]) != "quanto") and (stripWord(bits[i-1]) != "mais")
-        else:
-            preART = False
+        preART = (preAgree & DET_O != 0) and \
+                 (preWord not in ["que", "dado", "tanto", "quanto", "mais"])
+        posNOUNDET = (posAgree & NOUN_ADJ_DET_O != 0)
         if (i < len(bits)-1):
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "DET")
             posLower = not bits[i+1][0].isupper()
-            if (posNOUNDET):
-                possible = lex.pget(stripWord(bits[i+1]), "NOUN")+lex.pget(stripWord(bits[i+1]), "ADJ")+lex.pget(stripWord(bits[i+1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Plur" not in feats[2]) and ("Gender=Fem" not in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    posNOUNDET = False
         else:
-            posNOUNDET = False
             posLower = True
         if (preART) and (not posNOUNDET) and (posLower):
             tokens.append([token, lastField])  # don't break
@@ -425,35 +477,12 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
                 tokens.append(["o","_"])
     # pelos - por os - pelos
     elif (token.lower() == "pelos"):
-        if (i > 0):
-            preART = lex.pexists(stripWord(bits[i-1]), "DET")
-            if (preART):
-                possible = lex.pget(stripWord(bits[i-1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Sing" not in feats[2]) and ("Gender=Fem" not in feats[2]) and ("PronType=Art" in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    preART = False
-                else:
-                    preART = (stripWord(bits[i-1]) != "que") and (stripWord(bits[i-1]) != "dado") and (stripWord(bits[i-1]) != "tanto") and (stripWord(bits[i-1]) != "quanto") and (stripWord(bits[i-1]) != "mais")
-        else:
-            preART = False
+        preART = (preAgree & DET_ART_OS != 0) and \
+                 (preWord not in ["que", "dado", "tanto", "quanto", "mais"])
+        posNOUNDET = (posAgree & NOUN_ADJ_DET_ART_OS != 0)
         if (i < len(bits)-1):
-            posNOUNDET = lex.pexists(stripWord(bits[i+1]), "NOUN") or lex.pexists(stripWord(bits[i+1]), "ADJ") or lex.pexists(stripWord(bits[i+1]), "DET")
             posLower = not bits[i+1][0].isupper()
-            if (posNOUNDET):
-                possible = lex.pget(stripWord(bits[i+1]), "NOUN")+lex.pget(stripWord(bits[i+1]), "ADJ")+lex.pget(stripWord(bits[i+1]), "DET")
-                agree = False
-                for feats in possible:
-                    if ("Number=Sing" not in feats[2]) and ("Gender=Fem" not in feats[2]) and ("PronType=Art" in feats[2]):
-                        agree = True
-                        break
-                if (not agree):
-                    posNOUNDET = False
         else:
-            posNOUNDET = False
             posLower = True
         if (preART) and (not posNOUNDET) and (posLower):
             tokens.append([token, lastField])  # don't break
@@ -473,11 +502,19 @@ def desambIt(token, bits, i, lastField, s, SID, tokens):
 #  Tokenizing - tokenizeIt (step 3)
 #############################################################################
 def tokenizeIt(s, SID, outfile):
-    removable = ["'", '"', "(", ")", "[", "]", "{", "}", "<", ">", \
+    return printIt(splitIt(s, SID), s, SID, outfile)
+
+#############################################################################
+#  Tokenizer with its tables (abbreviations, contractions, enclisis) loaded
+#     once - PortTokenizer (within step 3)
+#############################################################################
+class PortTokenizer:
+    removable = {"'", '"', "(", ")", "[", "]", "{", "}", "<", ">", \
                  "!", "?", ",", ";", ":", "=", "+", "*", "★", "|", "/", "\\", \
-                 "&", "^", "_", "`", "'", "~", "%"]
-    ignored   = ["@", "#"]
-    digits  = ["0", "1", "2", "3", "4", "5", "6", "7", "8", "9"]
+                 "&", "^", "_", "`", "~", "%"}
+    trailing  = removable | {"-", "."}
+    ignored   = {"@", "#"}
+    digits    = {"0", "1", "2", "3", "4", "5", "6", "7", "8", "9"}
     contracts = {"à":["a","a"],
                  "às":["a","as"],
                  "ao":["a", "o"],
@@ -568,139 +605,129 @@ def tokenizeIt(s, SID, outfile):
                  "pruns":["para", "uns"],
                  "pruma":["para", "uma"],
                  "prumas":["para", "umas"]}
-    ambigous = ["nos", "consigo", "pra", "pela", "pelas", "pelo", "pelos"]
-#    ambigous = ["nos", "consigo", "pra", "pelo", "pelos"]
-    enclisis = ['me', 'te', 'se', 'lhe', 'o', 'a', 'nos', 'vos', 'lhes', 'os', 'as', 'lo', 'la', 'los', 'las']
-    terminations = ["ia", "ias", "as", "iamos", "ieis", "iam", "ei", "as", "a", "emos", "eis", "ão", "á"]
-    abbrev = []
-    infile = open(os.path.join('portTokenizer',"abbrev.txt"), "r")
-    for line in infile:
-        abbrev.append(line[:-1])
-    infile.close()
-    def isAbbrev(chunk, abbrev):
-        abbr = False
-        for a in abbrev:
-            if (chunk == a):
-                abbr = True
-                break
-            else:
-                lasts = -len(a)
-                if (chunk[lasts:] == a) and (not chunk[lasts-1].isalpha()):
-                    abbr = True
-                    break
-        return abbr
-    if (SID[-2:] == "80"):
-        xxxx = 0
-    tokens = []
-    bits = s.split(" ")
-    k = 0
-    for b in bits:
-        # deal with the pre (before) middle
-        pre = []
-        changed = True
-        while (changed) and (len(b) > 1):
-            changed = False
-            if (b[0] in removable) or ((b[0] == "$") and (b[1] in digits)) or ((b[0] == "-") and (b[1] not in digits)):
-                pre.append(b[0])
-                b = b[1:]
-                changed = True
-        # deal with the pos (after) middle
-        tmp = []
-        changed = True
-        while (changed) and (len(b) > 1):
-            if (isAbbrev(b, abbrev)):
-                break
-            changed = False
-            if (b[-1] in removable+["-", "."]):
-                tmp.append(b[-1])
-                b = b[:-1]
-                changed = True
-        pos = []
-        reticent = ""
-        for i in range(len(tmp)-1, -1, -1):
-            if (tmp[i] == "."):
-                if (reticent == ""):
-                    reticent = "."
-                elif (reticent == "."):
-                    reticent = ".."
-                elif (reticent == ".."):
-                    pos.append("...")
-                    reticent = ""
-            else:
-                if (reticent != ""):
-                    pos.append(reticent)
-                    reticent = ""
-                pos.append(tmp[i])
-        if (reticent != ""):
-            pos.append(reticent)
-        # deal with the middle
-        buf = b.split("-")
-        if (len(buf) == 1):
-            parts = pre+[b]+pos
-        # enclisis
-        elif (len(buf) == 2) and (buf[1] in enclisis):
-            if (buf[0][-1] == "á"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"ar", buf[1]]+pos
-            elif (buf[0][-1] == "ê"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"er", buf[1]]+pos
-            elif (buf[0][-1] == "í"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"ir", buf[1]]+pos
-            elif (buf[0][-1] == "ô"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"or", buf[1]]+pos
-            else:
-                parts = pre+["*^*"+b, buf[0], buf[1]]+pos
-        # mesoclisis - type I (e.g. dar-lo-ia)
-        elif (len(buf) == 3) and (buf[1] in enclisis) \
-            and (buf[0][-1] == "r") and (buf[2] in terminations):
-            parts = pre+["*^*"+b, buf[0]+buf[2], buf[1]]+pos
-        # mesoclisis - type II (e.g. dá-lo-ia)
-        elif (len(buf) == 3) and (buf[1] in enclisis) \
-            and (buf[0][-1] in ["á", "ê", "í", "ô"]) and (buf[2] in terminations):
-            if (buf[0][-1] == "á"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"ar"+buf[2], buf[1]]+pos
-            elif (buf[0][-1] == "ê"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"er"+buf[2], buf[1]]+pos
-            elif (buf[0][-1] == "í"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"ir"+buf[2], buf[1]]+pos
-            elif (buf[0][-1] == "ô"):
-                parts = pre+["*^*"+b, buf[0][:-1]+"or"+buf[2], buf[1]]+pos
-        else:
-            parts = pre+[b]+pos
-        # transform parts into tokens to be added
-        i = 0
-        while (i < len(parts)):
-            if (i == len(parts)-1):
-                lastField = "_"
-            else:
-                lastField = "SpaceAfter=No"
-            if (parts[i][:3] == "*^*"):
-                if (i+3 == len(parts)):
-                    tokens.append([parts[i][3:], "c_"])
+    ambigous = {"nos", "consigo", "pra", "pela", "pelas", "pelo", "pelos"}
+    enclisis = {'me', 'te', 'se', 'lhe', 'o', 'a', 'nos', 'vos', 'lhes', 'os', 'as', 'lo', 'la', 'los', 'las'}
+    terminations = {"ia", "ias", "as", "iamos", "ieis", "iam", "ei", "a", "emos", "eis", "ão", "á"}
+    dots = re.compile(r"\.{1,3}|[^.]")
+
+    def __init__(self, abbrevFile=os.path.join(os.path.dirname(os.path.abspath(__file__)), "abbrev.txt")):
+        # the abbreviations index, shared with portSent (see portText.py)
+        self.abbrev = portText.abbrevIndex(abbrevFile)
+        self.abbrevs = self.abbrev.abbrevs
+
+    #########################################################################
+    #  Is the chunk an abbreviation, or does it end with an abbreviation
+    #     preceded by a non letter - isAbbrev
+    #########################################################################
+    def isAbbrev(self, chunk):
+        return self.abbrev.isAbbrev(chunk)
+
+    #########################################################################
+    #  Split a sentence into its tokens - tokenize
+    #########################################################################
+    def tokenize(self, s):
+        tokens = []
+        bits = s.split(" ")
+        k = 0
+        for b in bits:
+            # deal with the pre (before) middle - b[:start]
+            start, end = 0, len(b)
+            while (end-start > 1) and ((b[start] in self.removable) or \
+                  ((b[start] == "$") and (b[start+1] in self.digits)) or ((b[start] == "-") and (b[start+1] not in self.digits))):
+                start += 1
+            pre = list(b[:start])
+            # deal with the pos (after) middle - b[end:], stopping at an abbreviation
+            while (end-start > 1) and (b[end-1] in self.trailing) and (not self.abbrev.isAbbrevAt(b, start, end)):
+                end -= 1
+            # each punctuation is a token, but the dots are grouped by three (ellipsis)
+            pos = self.dots.findall(b, end)
+            b = b[start:end]
+            # deal with the middle
+            buf = b.split("-")
+            if (len(buf) == 1):
+                parts = pre+[b]+pos
+            # enclisis
+            elif (len(buf) == 2) and (buf[1] in self.enclisis):
+                if (buf[0][-1] == "á"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"ar", buf[1]]+pos
+                elif (buf[0][-1] == "ê"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"er", buf[1]]+pos
+                elif (buf[0][-1] == "í"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"ir", buf[1]]+pos
+                elif (buf[0][-1] == "ô"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"or", buf[1]]+pos
                 else:
-                    tokens.append([parts[i][3:], "cSpaceAfter=No"])
-                i += 1
-                tokens.append([parts[i], "_"])
-                i += 1
-                tokens.append([parts[i], "_"])
-            elif (parts[i] not in ambigous):
-                ans = contracts.get(parts[i].lower())
-                if (ans == None):
-                    tokens.append([parts[i], lastField])
+                    parts = pre+["*^*"+b, buf[0], buf[1]]+pos
+            # mesoclisis - type I (e.g. dar-lo-ia)
+            elif (len(buf) == 3) and (buf[1] in self.enclisis) \
+                and (buf[0][-1] == "r") and (buf[2] in self.terminations):
+                parts = pre+["*^*"+b, buf[0]+buf[2], buf[1]]+pos
+            # mesoclisis - type II (e.g. dá-lo-ia)
+            elif (len(buf) == 3) and (buf[1] in self.enclisis) \
+                and (buf[0][-1] in ["á", "ê", "í", "ô"]) and (buf[2] in self.terminations):
+                if (buf[0][-1] == "á"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"ar"+buf[2], buf[1]]+pos
+                elif (buf[0][-1] == "ê"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"er"+buf[2], buf[1]]+pos
+                elif (buf[0][-1] == "í"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"ir"+buf[2], buf[1]]+pos
+                elif (buf[0][-1] == "ô"):
+                    parts = pre+["*^*"+b, buf[0][:-1]+"or"+buf[2], buf[1]]+pos
+            else:
+                parts = pre+[b]+pos
+            # transform parts into tokens to be added
+            i = 0
+            while (i < len(parts)):
+                if (i == len(parts)-1):
+                    lastField = "_"
                 else:
-                    tokens.append([parts[i], "c"+lastField])
-                    if (parts[i].isupper()):
-                        tokens.append([ans[0].upper(),"_"])
-                        tokens.append([ans[1].upper(),"_"])
-                    elif (parts[i][0].isupper()):
-                        tokens.append([ans[0][0].upper()+ans[0][1:],"_"])
-                        tokens.append([ans[1],"_"])
+                    lastField = "SpaceAfter=No"
+                if (parts[i][:3] == "*^*"):
+                    if (i+3 == len(parts)):
+                        tokens.append([parts[i][3:], "c_"])
                     else:
-                        tokens.append([ans[0],"_"])
-                        tokens.append([ans[1],"_"])
-            else:
-                desambIt(parts[i], bits, k, lastField, s, SID, tokens)
-            i += 1
-        k += 1
+                        tokens.append([parts[i][3:], "cSpaceAfter=No"])
+                    i += 1
+                    tokens.append([parts[i], "_"])
+                    i += 1
+                    tokens.append([parts[i], "_"])
+                elif (parts[i] not in self.ambigous):
+                    ans = self.contracts.get(parts[i].lower())
+                    if (ans == None):
+                        tokens.append([parts[i], lastField])
+                    else:
+                        tokens.append([parts[i], "c"+lastField])
+                        if (parts[i].isupper()):
+                            tokens.append([ans[0].upper(),"_"])
+                            tokens.append([ans[1].upper(),"_"])
+                        elif (parts[i][0].isupper()):
+                            tokens.append([ans[0][0].upper()+ans[0][1:],"_"])
+                            tokens.append([ans[1],"_"])
+                        else:
+                            tokens.append([ans[0],"_"])
+                            tokens.append([ans[1],"_"])
+                else:
+                    desambIt(parts[i], bits, k, lastField, s, "", tokens)
+                i += 1
+            k += 1
+        return tokens
+
+    #########################################################################
+    #  Output a tokenized sentence in CoNLL-U - write
+    #########################################################################
+    def write(self, tokens, s, SID, outfile):
+        return printIt(tokens, s, SID, outfile)
+
+#############################################################################
+#  Split a sentence into its tokens - splitIt (within step 3)
+#############################################################################
+def splitIt(s, SID):
+    return tokenizer.tokenize(s)
+
+#############################################################################
+#  Output a tokenized sentence in CoNLL-U - printIt (within step 3)
+#############################################################################
+def printIt(tokens, s, SID, outfile):
     # output the sentence with all the tokens
     print("# sent_id =", SID, file=outfile)
     print("# text =", s, file=outfile)
@@ -716,50 +743,165 @@ def tokenizeIt(s, SID, outfile):
     print(file=outfile)
     return(toks)
 
+tokenizer = PortTokenizer()
+
 #################################################
 ### Deal with a sentence, clean it, if required, then tokenize it
 #################################################
-def dealWith(outfile, sent, SID, match, trim):
+def cleanIt(sent, match, trim):
     if (trim):
         sent = trimIt(sent)
     if (match):
         sent = punctIt(sent)
+    return sent
+
+def dealWith(outfile, sent, SID, match, trim):
+    sent = cleanIt(sent, match, trim)
     if (sent != ""):
         return 1, tokenizeIt(sent, SID, outfile)
     else:
         return 0, 0
 
+#################################################
+### Clean and tokenize every line (one sentence per line) of infile, yielding
+###    the sentence id, the clean sentence and its tokens for each non empty one
+#################################################
+def tokenizeLines(infile, match, trim, SID):
+    for line in infile:
+        SID = nextName(SID)
+        sent = cleanIt(line[:-1], match, trim)
+        if (sent != ""):
+            yield SID, sent, splitIt(sent, SID)
+
+#################################################
+### Tokenize every line (one sentence per line) of infile into a CoNLL-U document
+#################################################
+def tokenizeAll(infile, outfile, docName, match, trim, SID, flush=False):
+    print("# newdoc id = {}\n# newpar".format(docName), file=outfile)
+    sTOTAL, tTOTAL = 0, 0
+    for line in infile:
+        SID = nextName(SID)
+        s, t = dealWith(outfile, line[:-1], SID, match, trim)
+        if (s == 1):
+            sTOTAL += 1
+            tTOTAL += t
+        # in a pipeline, each sentence goes to the next stage as soon as it is tokenized
+        if (flush):
+            outfile.flush()
+    return sTOTAL, tTOTAL
+
+#################################################
+### Tokenize a chunk of lines, each one with its sid, into a CoNLL-U string
+###    (executed by the parallel processes)
+#################################################
+def tokenizeChunk(chunk, match, trim):
+    outfile = io.StringIO()
+    sTOTAL, tTOTAL = 0, 0
+    for SID, line in chunk:
+        s, t = dealWith(outfile, line[:-1], SID, match, trim)
+        if (s == 1):
+            sTOTAL += 1
+            tTOTAL += t
+    return outfile.getvalue(), sTOTAL, tTOTAL
+
+#################################################
+### Use the lexicon in the shared memory block named shared (initializer of the
+###    parallel processes)
+#################################################
+def attachLexicon(shared):
+    global lex
+    lex = lexikon.UDlexPT(shared=shared)
+
+#################################################
+### Split infile into chunks of lines, giving each line the sid the serial
+###    tokenization (tokenizeAll) would give it
+#################################################
+def chunkLines(infile, SID, size):
+    chunk = []
+    for line in infile:
+        SID = nextName(SID)
+        chunk.append((SID, line))
+        if (len(chunk) == size):
+            yield chunk
+            chunk = []
+    if (chunk != []):
+        yield chunk
+
+#################################################
+### Tokenize every line of infile into a CoNLL-U document with a pool of jobs
+###    processes, writing the chunks in the input order - the output is the
+###    same of tokenizeAll
+#################################################
+def tokenizeParallel(infile, outfile, docName, match, trim, SID, jobs, size=1000):
+    print("# newdoc id = {}\n# newpar".format(docName), file=outfile)
+    sTOTAL, tTOTAL = 0, 0
+    # the processes share one copy of the lexicon: the snapshot mapped here (inherited),
+    #    or else a shared memory copy attached by new processes (see lexikon.py)
+    if (lex.snapshot == None):
+        pool = multiprocessing.get_context("spawn").Pool(jobs, initializer=attachLexicon, initargs=(lex.share(),))
+    else:
+        pool = multiprocessing.Pool(jobs)
+    try:
+        chunks = chunkLines(infile, SID, size)
+        pending = []
+        while True:
+            # keep two chunks per process under way, so the input is not read all at once
+            for chunk in chunks:
+                pending.append(pool.apply_async(tokenizeChunk, (chunk, match, trim)))
+                if (len(pending) == 2*jobs):
+                    break
+            if (pending == []):
+                break
+            conllu, s, t = pending.pop(0).get()
+            outfile.write(conllu)
+            outfile.flush()
+            sTOTAL += s
+            tTOTAL += t
+    finally:
+        pool.close()
+        pool.join()
+        if (lex.shm != None):
+            lex.unshare()
+    return sTOTAL, tTOTAL
+
 #################################################
 ### função principal do programa - busca argumentos e chama 'tokenize' para cada sentença da entrada
 #################################################
 def portTok():
     if (len(sys.argv) == 1):
-        arguments = ["sents.conllu", "sents.txt", True, True, "S0000"]
+        arguments = ["sents.conllu", "sents.txt", True, True, "S0000", 1]
         print("Assumindo default: 'sents.conllu' como arquivo de saída, 'sents.txt' como arquivo de entrada, correções, remoções e S0000 como sid.")
     else:
         arguments = parseOptions(sys.argv)
     if (arguments != None):
-        if (arguments[0] == ""):
+        if (arguments[0] == "") and (arguments[1] == "-"):
+            arguments[0] = "-"
+        elif (arguments[0] == ""):
             print("Assumindo 'sents.conllu' como arquivo de saída")
             arguments[0] = 'sents.conllu'
         if (arguments[1] == []):
             print("Arquivo de entrada inválido - por favor corrija e tente novamente")
         else:
-            outfile = open(arguments[0], "w")
-            print("# newdoc id = {}\n# newpar".format(arguments[0]), file=outfile)
-            infile = open(arguments[1], "r")
-            SID = arguments[4]
-            sTOTAL, tTOTAL = 0, 0
-            for line in infile:
-                SID = nextName(SID)
-                s, t = dealWith(outfile, line[:-1], SID, arguments[2], arguments[3])
-                if (s == 1):
-                    sTOTAL += 1
-                    tTOTAL += t
-            outfile.close()
-            infile.close()
-            print("Tokenização terminada com {} sentenças extraídas ({} tokens) e salvas em {}".format(sTOTAL, tTOTAL, arguments[0]))
+            # the standard output carries the sentences, the messages go to the standard error
+            if (arguments[0] == "-"):
+                outfile, docName, messages = sys.stdout, "stdout", sys.stderr
+            else:
+                outfile, docName, messages = open(arguments[0], "w"), arguments[0], sys.stdout
+            if (arguments[1] == "-"):
+                infile = sys.stdin
+            else:
+                infile = open(arguments[1], "r")
+            if (arguments[5] > 1):
+                sTOTAL, tTOTAL = tokenizeParallel(infile, outfile, docName, arguments[2], arguments[3], arguments[4], arguments[5])
+            else:
+                sTOTAL, tTOTAL = tokenizeAll(infile, outfile, docName, arguments[2], arguments[3], arguments[4], outfile == sys.stdout)
+            if (outfile != sys.stdout):
+                outfile.close()
+            if (infile != sys.stdin):
+                infile.close()
+            print("Tokenização terminada com {} sentenças extraídas ({} tokens) e salvas em {}".format(sTOTAL, tTOTAL, docName), file=messages)
     else:
         print("Problemas com parâmetros - por favor corrija e tente novamente")
 
-portTok()
+if __name__ == "__main__":
+    portTok()
@@ -0,0 +1,246 @@
+# portTokBench - regressão (saída idêntica a arquivos de referência) e
+#    microbenchmark do tokenizador portTok
+#
+# Os arquivos de referência (golden) são gerados pela opção -u a partir de
+#    'sents.txt' e de um corpus gerado ('golden/generated.txt') com contrações,
+#    ênclises e mesóclises, abreviações, formas ambíguas (nos, consigo, pra,
+#    pela, pelas, pelo, pelos), pontuações pareadas e manchetes, e salvos na
+#    pasta 'golden' junto com a assinatura (sha1 do conteúdo) do léxico e das
+#    abreviações usados. Os arquivos de referência são versionados: depois de
+#    uma mudança no tokenizador, a verificação compara byte a byte a saída atual
+#    com eles, e falha se o léxico instalado (WORDmaster.txt e .tsv) não for o
+#    mesmo da assinatura (nesse caso as referências devem ser geradas de novo
+#    com -u em uma versão confiável do tokenizador, antes da mudança).
+#
+# O microbenchmark mede, para trimIt, punctIt, splitIt, printIt, tokenizeIt e
+#    desambIt, as chamadas e tokens por segundo e o pico de memória alocada.
+#
+# Opções:
+#
+# -h help
+# -u update the golden files (run it before changing the tokenizer)
+# -b run the microbenchmark
+# -r number of repetitions of the microbenchmark
+# -o output file of the microbenchmark results (json)
+#
+# Exemplo de utilização:
+#
+# python3 portTokBench.py -u            (na versão de referência)
+# python3 portTokBench.py -b -o bench.json
+#
+# Verifica a saída do tokenizador contra os arquivos de referência e
+#   salva as medidas do microbenchmark no arquivo 'bench.json'
+
+import sys, os, io, json, random, time, tracemalloc, hashlib
+import portTok
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_DIR = os.path.join(BASE_DIR, "golden")
+
+#################################################
+### Corpus gerado cobrindo os casos difíceis do tokenizador
+#################################################
+def generateCorpus(seed=42):
+    rnd = random.Random(seed)
+    abbrev = sorted(portTok.tokenizer.abbrevs)
+    sents = []
+    # contractions, in lower, capitalized and upper case
+    for c in sorted(portTok.PortTokenizer.contracts):
+        sents.append("Ele falou {} casa ontem.".format(c))
+        sents.append("{} casa ele falou.".format(c[0].upper()+c[1:]))
+        sents.append("ELE FALOU {} CASA.".format(c.upper()))
+    # enclisis and mesoclisis
+    for clitic in sorted(portTok.PortTokenizer.enclisis):
+        for verb in ["fazê", "dá", "parti", "pô", "diga", "vendeu", "compraram"]:
+            sents.append("Ele quer {}-{} agora.".format(verb, clitic))
+        for verb in ["dar", "comprar", "vender", "dá", "fazê", "parti", "pô"]:
+            sents.append("Ela {}-{}-{} amanhã.".format(verb, clitic, rnd.choice(sorted(portTok.PortTokenizer.terminations))))
+    # abbreviations, alone, inside punctuation and at the end of the sentence
+    for a in abbrev:
+        sents.append("O {} Silva chegou cedo.".format(a))
+        sents.append('Ele disse ("{}") e saiu.'.format(a))
+        sents.append("Quem chegou foi o {}".format(a))
+        sents.append("Ontem, {}, tudo mudou...".format(a.upper()))
+    # ambiguous forms between many kinds of neighbours
+    previous = ["Ele", "os", "o", "a", "que", "mais", "dado", "tanto", "comeu", "Eu", "(", "disse", "ela"]
+    following = ["livros", "casa", "Maria", "2020", "disse", "dar", "do que", "sua", "mesa", "grandes", "ruas", "o", "deu"]
+    for form in ["nos", "consigo", "pra", "pela", "pelas", "pelo", "pelos"]:
+        for p in previous:
+            for f in following:
+                variant = rnd.choice([form, form.upper(), form[0].upper()+form[1:]])
+                sents.append("{} {} {} hoje.".format(p, variant, f))
+        sents.append("Ele olhou {}.".format(form))
+        sents.append("{} caminhos.".format(form[0].upper()+form[1:]))
+    # paired punctuations, headlines, itemize symbols and noise
+    noise = ['"Ele saiu."', "'Ela voltou'", "(Tudo bem)", "[Nada feito]", "{Chaves}", "<Tag>",
+             'Ele disse "oi e saiu.', "Ela (sorriu e saiu.", "Fim..", "Fim:.", "Será?!", 'Foi "bom".',
+             "CRONOLOGIA Lula disse que vai.", "(BELO HORIZONTE) O prefeito falou.", "* Item da lista",
+             "- Outro item", "★ Destaque do dia", "ECONOMIA Juros sobem de novo.", "Veja http://site.com.br/a?b=1.",
+             "Custa $20 ou -10 por cento...", "Ele disse: vamos!!! Agora...", "E-mail: fulano@site.com.", "Ok......"]
+    for n in noise:
+        sents.append(n)
+        sents.append(n.upper())
+    return "".join(sent+"\n" for sent in sents)
+
+#################################################
+### Casos de regressão: nome, texto de entrada e opções (match, trim)
+#################################################
+def goldenCases():
+    infile = open(os.path.join(BASE_DIR, "sents.txt"), "r")
+    sents = infile.read()
+    infile.close()
+    infile = open(os.path.join(GOLDEN_DIR, "generated.txt"), "r")
+    generated = infile.read()
+    infile.close()
+    return [["sents", sents, False, False], ["sents_m_t", sents, True, True],
+            ["generated", generated, False, False], ["generated_m_t", generated, True, True]]
+
+def tokenizeText(text, name, match, trim):
+    outfile = io.StringIO()
+    portTok.tokenizeAll(io.StringIO(text), outfile, name+".conllu", match, trim, "S0000")
+    return outfile.getvalue()
+
+def lexiconSignature():
+    signature = hashlib.sha1()
+    for name in sorted(os.listdir(BASE_DIR)):
+        if (name.endswith(".tsv")) or (name in ["WORDmaster.txt", "abbrev.txt"]):
+            infile = open(os.path.join(BASE_DIR, name), "rb")
+            signature.update(name.encode("utf-8")+infile.read())
+            infile.close()
+    return signature.hexdigest()
+
+def updateGolden():
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    if (not os.path.isfile(os.path.join(GOLDEN_DIR, "generated.txt"))):
+        outfile = open(os.path.join(GOLDEN_DIR, "generated.txt"), "w")
+        outfile.write(generateCorpus())
+        outfile.close()
+    for name, text, match, trim in goldenCases():
+        outfile = open(os.path.join(GOLDEN_DIR, name+".conllu"), "w")
+        outfile.write(tokenizeText(text, name, match, trim))
+        outfile.close()
+    outfile = open(os.path.join(GOLDEN_DIR, "lexicon.sha1"), "w")
+    outfile.write(lexiconSignature()+"\n")
+    outfile.close()
+    print("Arquivos de referência salvos em", GOLDEN_DIR)
+
+def checkGolden():
+    if (not os.path.isfile(os.path.join(GOLDEN_DIR, "lexicon.sha1"))):
+        print("ERRO: arquivos de referência não encontrados - execute com -u na versão de referência")
+        return False
+    infile = open(os.path.join(GOLDEN_DIR, "lexicon.sha1"), "r")
+    signature = infile.read().strip()
+    infile.close()
+    if (signature != lexiconSignature()):
+        print("ERRO: o léxico ou as abreviações não são os usados na geração dos arquivos de referência",
+              "(assinatura {}, instalado {}) - gere-os de novo com -u".format(signature, lexiconSignature()),
+              "em uma versão confiável do tokenizador", sep="\n")
+        return False
+    ok = True
+    for name, text, match, trim in goldenCases():
+        infile = open(os.path.join(GOLDEN_DIR, name+".conllu"), "r")
+        golden = infile.read()
+        infile.close()
+        current = tokenizeText(text, name, match, trim)
+        if (current == golden):
+            print("{:15} idêntico ({} linhas)".format(name, golden.count("\n")))
+        else:
+            ok = False
+            goldenLines, currentLines = golden.split("\n"), current.split("\n")
+            for i in range(max(len(goldenLines), len(currentLines))):
+                if (i >= len(goldenLines)) or (i >= len(currentLines)) or (goldenLines[i] != currentLines[i]):
+                    break
+            print("{:15} DIFERENTE a partir da linha {}:".format(name, i+1))
+            print("  referência:", goldenLines[i] if i < len(goldenLines) else "<fim>")
+            print("  atual:     ", currentLines[i] if i < len(currentLines) else "<fim>")
+    return ok
+
+#################################################
+### Microbenchmark de cada função do tokenizador
+#################################################
+class Discard:
+    # output file that ignores everything written, so printIt measures only itself
+    def write(self, s):
+        return len(s)
+
+def measure(name, function, calls, tokens, repeat):
+    # time over repeat passes, peak memory over one pass
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in calls:
+            function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    for args in calls:
+        function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {"calls_per_second": repeat*len(calls)/elapsed, "tokens_per_second": repeat*tokens/elapsed,
+              "seconds": elapsed, "peak_kb": peak/1024}
+    print("{:12} {:10.0f} chamadas/s {:10.0f} tokens/s  pico de memória {:8.1f} KB".format(
+        name, result["calls_per_second"], result["tokens_per_second"], result["peak_kb"]))
+    return result
+
+def benchmark(repeat):
+    sents = [line[:-1] for line in goldenCases()[0][1].splitlines(True)+goldenCases()[2][1].splitlines(True) if line.strip() != ""]
+    trimmed = [portTok.trimIt(s) for s in sents]
+    clean = [c for c in [portTok.punctIt(t) for t in trimmed] if c != ""]
+    splits = [portTok.splitIt(c, "S0000") for c in clean]
+    tokens = sum(len(t) for t in splits)
+    contexts = []
+    for c in clean:
+        bits = c.split(" ")
+        for i in range(len(bits)):
+            if (bits[i] in portTok.PortTokenizer.ambigous):
+                contexts.append((bits[i], bits, i, "_", c, "S0000", []))
+    results = {}
+    results["trimIt"] = measure("trimIt", portTok.trimIt, [(s,) for s in sents], tokens, repeat)
+    results["punctIt"] = measure("punctIt", portTok.punctIt, [(t,) for t in trimmed if t != ""], tokens, repeat)
+    results["splitIt"] = measure("splitIt", portTok.splitIt, [(c, "S0000") for c in clean], tokens, repeat)
+    results["printIt"] = measure("printIt", portTok.printIt, [(splits[i], clean[i], "S0000", Discard()) for i in range(len(clean))], tokens, repeat)
+    results["tokenizeIt"] = measure("tokenizeIt", portTok.tokenizeIt, [(c, "S0000", Discard()) for c in clean], tokens, repeat)
+    portTok.profileIt.cache_clear()
+    results["desambIt"] = measure("desambIt", portTok.desambIt, contexts, len(contexts), repeat)
+    return results
+
+#################################################
+### função principal do programa
+#################################################
+def portTokBench():
+    update, bench, repeat, output = False, False, 5, ""
+    i = 1
+    while i < len(sys.argv):
+        if (sys.argv[i] in ["-h", "-help"]):
+            print("Opções:\n-h ajuda\n-u atualiza os arquivos de referência\n-b executa o microbenchmark",
+                  "-r número de repetições do microbenchmark\n-o arquivo de saída do microbenchmark (json)", sep="\n")
+            return 0
+        elif (sys.argv[i] in ["-u", "-update"]):
+            update = True
+            i += 1
+        elif (sys.argv[i] in ["-b", "-bench"]):
+            bench = True
+            i += 1
+        elif (sys.argv[i] in ["-r", "-repeat"]) and (i+1 < len(sys.argv)):
+            repeat = int(sys.argv[i+1])
+            i += 2
+        elif (sys.argv[i] in ["-o", "-output"]) and (i+1 < len(sys.argv)):
+            output, bench = sys.argv[i+1], True
+            i += 2
+        else:
+            print("Opção {} inválida, por favor execute novamente".format(sys.argv[i]))
+            return 2
+    if (update):
+        updateGolden()
+        ok = True
+    else:
+        ok = checkGolden()
+    if (bench):
+        results = benchmark(repeat)
+        if (output != ""):
+            outfile = open(output, "w")
+            json.dump({"time": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": repeat, "results": results}, outfile, indent=1)
+            outfile.close()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(portTokBench())
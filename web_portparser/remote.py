@@ -0,0 +1,118 @@
+# Portparser remote backends - clients of udpipe2_server.py and of the
+#   WEmbeddings server (start_wembeddings_server.py), so that several front
+#   ends can share the same warm model processes.
+#
+# Each client keeps a bounded pool of persistent HTTP connections, reusing
+#   them while the server keeps them open, and retries the requests failing
+#   with a connection error or a 5xx status, waiting longer after each failure.
+#
+# Example of use:
+#
+#   wembeddings = WEmbeddingsClient("localhost:8000")
+#   embeddings = wembeddings.compute_embeddings("bert-base-portuguese-cased-last4", [["Maria", "gosta", "."]])
+#   udpipe2 = UDPipe2Client("http://localhost:8001", model="portparser")
+#   conllu = udpipe2.process(tokenized_conllu)
+
+import http.client
+import io
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+
+class RemoteError(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, url, size=4, timeout=120, retries=2, backoff=0.5):
+        url = urllib.parse.urlsplit(url if "://" in url else "http://" + url)
+        self._connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host, self._port, self._path = url.hostname, url.port, url.path.rstrip("/")
+        self._timeout, self._retries, self._backoff = timeout, retries, backoff
+        # At most `size` requests at once; the idle connections are reused most recent first
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def request(self, method, path, body=None, headers={}):
+        """Perform a request, returning the body of the response."""
+        attempt = 0
+        while True:
+            with self._slots:
+                try:
+                    connection, reused = self._idle.get_nowait(), True
+                except queue.Empty:
+                    connection, reused = self._connection_class(self._host, self._port, timeout=self._timeout), False
+                try:
+                    connection.request(method, self._path + path, body, headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    # The server may have closed an idle connection, try again at once with a new one
+                    if reused:
+                        continue
+                    status, error = None, RemoteError("Request to {}:{}{} failed: {}".format(self._host, self._port, path, e))
+                else:
+                    if response.will_close:
+                        connection.close()
+                    else:
+                        self._idle.put(connection)
+                    if response.status == 200:
+                        return data
+                    status, error = response.status, RemoteError("Request to {}:{}{} failed with status {}: {}".format(
+                        self._host, self._port, path, response.status, data.decode("utf-8", errors="replace")))
+
+            if attempt == self._retries or (status is not None and status < 500):
+                print(error, file=sys.stderr, flush=True)
+                raise error
+            time.sleep(self._backoff * 2 ** attempt)
+            attempt += 1
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class WEmbeddingsClient:
+    """Client of the WEmbeddings server, with the interface of WEmbeddings."""
+
+    def __init__(self, address, pool_size=4, timeout=120, retries=2):
+        self._pool = ConnectionPool(address, pool_size, timeout, retries)
+
+    def compute_embeddings(self, model, sentences):
+        response = io.BytesIO(self._pool.request(
+            "POST", "/wembeddings", json.dumps({"model": model, "sentences": sentences}, ensure_ascii=True).encode("ascii"),
+            {"Content-Type": "application/json"}))
+        return [np.lib.format.read_array(response, allow_pickle=False) for _ in sentences]
+
+
+class UDPipe2Client:
+    """Client of udpipe2_server, tagging and parsing already tokenized CoNLL-U."""
+
+    # Comments added by the server to the beginning of its output
+    GENERATOR_COMMENTS = ("# generator = ", "# udpipe_model = ", "# udpipe_model_licence = ")
+
+    def __init__(self, url, model=None, pool_size=4, timeout=120, retries=2):
+        self._pool = ConnectionPool(url, pool_size, timeout, retries)
+        self._model = model
+
+    def models(self):
+        return json.loads(self._pool.request("GET", "/models"))
+
+    def process(self, conllu):
+        params = {"input": "conllu", "output": "conllu", "tagger": "", "parser": "", "data": conllu}
+        if self._model is not None:
+            params["model"] = self._model
+        response = self._pool.request("POST", "/process", urllib.parse.urlencode(params).encode("utf-8"),
+                                      {"Content-Type": "application/x-www-form-urlencoded"})
+        try:
+            result = json.loads(response)["result"]
+        except (ValueError, KeyError):
+            raise RemoteError("Cannot parse the response of udpipe2_server: {}".format(response[:200]))
+        return "".join(line for line in result.splitlines(keepends=True) if not line.startswith(self.GENERATOR_COMMENTS))
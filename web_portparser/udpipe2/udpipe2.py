@@ -345,11 +345,15 @@ class UDPipe2:
                 if at_least_one_epoch: break
             at_least_one_epoch = True
 
-    def predict(self, dataset, evaluating, args):
+    def predict(self, dataset, evaluating, args, timings=None):
+        # When `timings` is given, the seconds spent in batching (DS), in the network (NW),
+        # in the tree decoding (MST) and in writing the output (RD) are added to it
         import io
         conllu, sentences = io.StringIO(), 0
+        spent = {"DS": 0., "NW": 0., "MST": 0., "RD": 0.}
 
         while not dataset.epoch_finished():
+            time_ds = time.perf_counter()
             sentence_lens, word_ids, charseq_ids, charseqs, charseq_lens = dataset.next_batch(args.batch_size)
 
             feeds = {self.is_training: False, self.sentence_lens: sentence_lens,
@@ -368,11 +372,15 @@ class UDPipe2:
             targets = [self.predictions]
             if self.morphodita: targets.extend([self.predictions_logits["XPOS"], self.predictions_logits["LEMMAS"]])
             if args.parse: targets.extend([self.heads_logs, self.deprel_hidden_layer])
+            time_nw = time.perf_counter()
+            spent["DS"] += time_nw - time_ds
             predictions, *other_values = self.session.run(targets, feeds)
+            spent["NW"] += time.perf_counter() - time_nw
             if self.morphodita: xpos_logits, lemma_logits, *other_values = other_values
             if args.parse: prior_heads, deprel_hidden_layer, *other_values = other_values
 
             if args.parse:
+                time_mst = time.perf_counter()
                 heads = np.zeros(prior_heads.shape[:2], dtype=np.int32)
                 for i in range(len(sentence_lens)):
                     padded_heads = np.pad(prior_heads[i][:sentence_lens[i], :sentence_lens[i] + 1].astype(np.float64),
@@ -382,9 +390,13 @@ class UDPipe2:
                         padded_heads[1 + np.argmax(prior_heads[i][:sentence_lens[i], 0]), 0] = 0
                     chosen_heads, _ = ufal.chu_liu_edmonds.chu_liu_edmonds(padded_heads)
                     heads[i, :sentence_lens[i]] = chosen_heads[1:]
+                time_nw = time.perf_counter()
+                spent["MST"] += time_nw - time_mst
                 deprels = self.session.run(self.predictions_deprel,
                                            {self.is_training: False, self.deprel_hidden_layer: deprel_hidden_layer, self.deprel_heads: heads})
+                spent["NW"] += time.perf_counter() - time_nw
 
+            time_rd = time.perf_counter()
             for i in range(len(sentence_lens)):
                 overrides = [None] * dataset.FACTORS
                 for tag in args.tags: overrides[dataset.FACTORS_MAP[tag]] = predictions[tag][i]
@@ -396,7 +408,11 @@ class UDPipe2:
                     overrides[dataset.DEPREL] = deprels[i]
                 dataset.write_sentence(conllu, sentences, overrides)
                 sentences += 1
+            spent["RD"] += time.perf_counter() - time_rd
 
+        if timings is not None:
+            for name, duration in spent.items():
+                timings[name] = timings.get(name, 0.) + duration
         return conllu.getvalue()
 
     def disambiguate_with_morphodita(self, forms, dataset, tag_logits, lemma_logits, overrides):
@@ -11,6 +11,7 @@
 """Word embeddings server class."""
 
 import http.server
+import io
 import json
 import socketserver
 import os
@@ -24,11 +25,17 @@ class WEmbeddingsServer(socketserver.ThreadingTCPServer):
 
     class WEmbeddingsRequestHandler(http.server.BaseHTTPRequestHandler):
         protocol_version = "HTTP/1.1"
+        # Close the kept alive connections idle for this many seconds
+        timeout = 60
 
-        def respond(request, content_type, code=200):
-            request.close_connection = True
+        def respond(request, content_type, code=200, content_length=None):
+            # Keep the connection open only when the client can find the end of the response
             request.send_response(code)
-            request.send_header("Connection", "close")
+            if content_length is None:
+                request.close_connection = True
+                request.send_header("Connection", "close")
+            else:
+                request.send_header("Content-Length", str(content_length))
             request.send_header("Content-Type", content_type)
             request.send_header("Access-Control-Allow-Origin", "*")
             request.end_headers()
@@ -71,9 +78,11 @@ class WEmbeddingsServer(socketserver.ThreadingTCPServer):
                     sys.stderr.flush()
                     return request.respond_error("An error occurred during wembeddings computation.")
 
-                request.respond("application/octet_stream")
+                response = io.BytesIO()
                 for sentence_embedding in sentences_embeddings:
-                    np.lib.format.write_array(request.wfile, sentence_embedding.astype(request.server._dtype), allow_pickle=False)
+                    np.lib.format.write_array(response, sentence_embedding.astype(request.server._dtype), allow_pickle=False)
+                request.respond("application/octet_stream", content_length=len(response.getbuffer()))
+                request.wfile.write(response.getbuffer())
 
             # URL not found
             else: